@@ -0,0 +1,38 @@
+# Times var collection on a long linear sum: the ToVarListTraverser (list concatenation at every node) against the
+# cached bottom-up analysis behind Expr.vars(), first and repeated calls, plus degree and program kind.
+#   PYTHONPATH=src python benchmarks/analysis.py [--terms 1000 4000]
+from __future__ import annotations
+
+import argparse
+import time
+
+from dsl.core import Var, ToVarListTraverser
+from dsl.program import Min
+
+
+def timed(f):
+    start = time.perf_counter()
+    f()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--terms', type=int, nargs='+', default=[1000, 4000])
+    args = parser.parse_args()
+
+    print(f'{"terms":>8} {"traverser [s]":>14} {"vars() [s]":>11} {"again [s]":>10} {"degree [s]":>11} {"kind [s]":>9}')
+    for n in args.terms:
+        vs = [Var(f'an{n}_{i}') for i in range(n)]
+        expr = 0
+        for i, v in enumerate(vs):
+            expr = expr + (i % 7 + 1) * v
+        traverser = timed(lambda: set(expr.traverse(ToVarListTraverser()).result))
+        first, again = timed(expr.vars), timed(expr.vars)
+        degree = timed(expr.degree)
+        kind = timed(lambda: Min(expr).st(expr <= n).kind)
+        print(f'{n:>8} {traverser:>14.3f} {first:>11.4f} {again:>10.6f} {degree:>11.4f} {kind:>9.4f}')
+
+
+if __name__ == '__main__':
+    main()
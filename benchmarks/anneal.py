@@ -0,0 +1,51 @@
+# Compares the NumPy AnnealBackend with SimulatedAnnealingBQMBackend (dimod's reference sampler) on identical max-cut instances.
+# Both backends compile the program into the same QUBO, so energies are directly comparable.
+#   PYTHONPATH=src python benchmarks/anneal.py [--nodes 200 500] [--reads 16 64] [--sweeps 200] [--workers 1]
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from backends.anneal import AnnealBackend
+from backends.dwave import SimulatedAnnealingBQMBackend
+from dsl.aggregators import Σ
+from dsl.core import BinVar
+from dsl.program import Max
+
+
+def maxcut(n: int, degree: int = 6, seed: int = 0) -> Max:
+    rng = np.random.default_rng(seed)
+    edges = sorted({tuple(sorted(e)) for e in rng.integers(0, n, size=(n * degree // 2, 2)).tolist() if e[0] != e[1]})
+    x = BinVar.new(f'mc{n}_{{}}', n)
+    return Max(Σ(edges)(lambda e: x[e[0]] + x[e[1]] - 2 * x[e[0]] * x[e[1]]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', type=int, nargs='+', default=[200, 500])
+    parser.add_argument('--reads', type=int, nargs='+', default=[16, 64])
+    parser.add_argument('--sweeps', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    print(f'{"nodes":>6} {"reads":>6} {"backend":>10} {"time [s]":>9} {"best":>10} {"mean":>10}')
+    for n in args.nodes:
+        p = maxcut(n)
+        for reads in args.reads:
+            numpy_backend = AnnealBackend(p, num_reads=reads, num_sweeps=args.sweeps, seed=0, workers=args.workers)
+            start = time.perf_counter()
+            _, energies = numpy_backend.sample()
+            print(f'{n:>6} {reads:>6} {"numpy":>10} {time.perf_counter() - start:>9.3f} {energies.min():>10.1f} {energies.mean():>10.1f}')
+
+            dwave_backend = SimulatedAnnealingBQMBackend(p)
+            start = time.perf_counter()
+            sampleset = dwave_backend._solver().sample(dwave_backend.p_, num_reads=reads, num_sweeps=args.sweeps)
+            energies = sampleset.record.energy
+            print(f'{n:>6} {reads:>6} {"dwave":>10} {time.perf_counter() - start:>9.3f} {energies.min():>10.1f} {energies.mean():>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# Measures memory per node of a large linear expression built as a tree of Expr objects and in an Arena, and the time
+# to compile it into coefficients (dsl.matrices.polynomial on the tree, ArenaExpr.linear on the arena). 'traced' is
+# everything allocated while building (for the arena including its var index and the slack of its arrays),
+# 'nodes' only the node storage itself (Arena.nbytes). Coefficients are either a few shared constants or a distinct
+# one per term (every term adds to the arena's constant pool then).
+#   PYTHONPATH=src python benchmarks/arena.py [--terms 10000 100000]
+from __future__ import annotations
+
+import argparse
+import itertools
+import time
+import tracemalloc
+
+from dsl.arena import Arena
+from dsl.core import Var
+from dsl.matrices import polynomial
+
+
+def measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    res = build()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return res, size, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--terms', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f'{"terms":>8} {"coeffs":>9} {"kind":>6} {"nodes":>8} {"traced B/node":>14} {"nodes B/node":>13} {"build [s]":>10} {"compile [s]":>12}')
+    for n, (coeffs, coeff) in itertools.product(args.terms, [('few', lambda i: i % 7 + 1), ('distinct', lambda i: 1 + i / n)]):
+        vs = [Var(f'a{n}{coeffs}_{i}') for i in range(n)]
+
+        def tree():
+            expr = 0
+            for i, v in enumerate(vs):
+                expr = expr + coeff(i) * v
+            return expr
+
+        def arena():
+            a = Arena()
+            expr = a.const(0)
+            for i, v in enumerate(vs):
+                expr = expr + coeff(i) * a.var(v)
+            return expr
+
+        expr, size, build = measure(tree)
+        nodes = 3 * n + 1  # per term a Const, a Mul and an Add plus the initial Const(0), the vars exist beforehand
+        start = time.perf_counter()
+        polynomial(expr, {v.name: i for i, v in enumerate(vs)}, vs)
+        print(f'{n:>8} {coeffs:>9} {"tree":>6} {nodes:>8} {size / nodes:>14.1f} {size / nodes:>13.1f} {build:>10.3f} {time.perf_counter() - start:>12.3f}')
+
+        expr, size, build = measure(arena)
+        start = time.perf_counter()
+        expr.linear()
+        print(f'{n:>8} {coeffs:>9} {"arena":>6} {expr.arena.size:>8} {size / expr.arena.size:>14.1f} {expr.arena.nbytes / expr.arena.size:>13.1f} {build:>10.3f} {time.perf_counter() - start:>12.3f}')
+
+
+if __name__ == '__main__':
+    main()
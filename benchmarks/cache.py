@@ -0,0 +1,37 @@
+# Resubmits an identical n x n assignment program (rebuilt from scratch each time, like a retried request) to HiGHS:
+# without cache, and through a ResultCache with memory and disk store. Building the program is not timed, a hit still
+# pays for hashing it.
+#   PYTHONPATH=src python benchmarks/cache.py [--n 20 40] [--requests 5]
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+
+from backends.cache import DiskStore, MemoryStore, ResultCache
+from backends.highs import ScipyMilpBackend
+from bench.instances import assignment
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n', type=int, nargs='+', default=[20, 40])
+    parser.add_argument('--requests', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f'{"n":>5} {"mode":>8} {"per request [s]":>16} {"hit rate":>9}')
+    with tempfile.TemporaryDirectory() as path:
+        for n in args.n:
+            for mode, cache in [('none', None), ('memory', ResultCache(MemoryStore())), ('disk', ResultCache(DiskStore(path)))]:
+                elapsed = 0.0
+                for _ in range(args.requests):
+                    p = assignment(n).p
+                    start = time.perf_counter()
+                    cache.solve(ScipyMilpBackend, p) if cache is not None else ScipyMilpBackend(p).solve()
+                    elapsed += time.perf_counter() - start
+                rate = f'{cache.stats.hit_rate:.2f}' if cache is not None else '-'
+                print(f'{n:>5} {mode:>8} {elapsed / args.requests:>16.4f} {rate:>9}')
+
+
+if __name__ == '__main__':
+    main()
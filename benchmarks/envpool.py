@@ -0,0 +1,89 @@
+# Throughput (models per minute) of many small knapsacks solved from a thread pool, the way a request-per-solve
+# service does: a fresh env per request, Gurobi's default env, envs from an EnvPool (one thread per solve), and one
+# pooled model per worker which is re-bound via Params and reset. Runs with the size-limited pip licence.
+#   PYTHONPATH=src python benchmarks/envpool.py [--requests 2000] [--items 20] [--workers 4]
+from __future__ import annotations
+
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from backends.gurobi import EnvPool, GurobiBackend
+from dsl.aggregators import Σ
+from dsl.core import BinVar, Param
+from dsl.program import Max, Program
+
+Profile = {'OutputFlag': 0, 'Threads': 1}
+
+
+def knapsack(n: int) -> tuple[Program, Param, Param]:
+    v, w = Param(value=np.zeros(n)), Param(value=np.zeros(n))
+    x = BinVar.new(f'ep{n}_{{}}', n)
+    return Max(Σ(range(n))(lambda i: v[i] * x[i])).st(Σ(range(n))(lambda i: w[i] * x[i]) <= n * 25), v, w
+
+
+def instance(n: int, seed: int) -> dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    return {'v': rng.integers(10, 100, size=n).astype(float), 'w': rng.integers(10, 100, size=n).astype(float)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--items', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+    n = args.items
+
+    def solve(backend: GurobiBackend, v: Param, w: Param, seed: int) -> float:
+        data = instance(n, seed)
+        backend.update_params({v: data['v'], w: data['w']})
+        result = backend.solve()
+        backend.dispose()
+        return result.x.sum()
+
+    def fresh(seed: int) -> float:
+        (p, v, w), pool = knapsack(n), EnvPool({'default': Profile})
+        with pool:
+            return solve(GurobiBackend(p, pool=pool), v, w, seed)
+
+    def default(seed: int) -> float:
+        p, v, w = knapsack(n)
+        return solve(GurobiBackend(p), v, w, seed)
+
+    shared = EnvPool({'default': Profile}, size=args.workers)
+
+    def pooled(seed: int) -> float:
+        p, v, w = knapsack(n)
+        return solve(GurobiBackend(p, pool=shared), v, w, seed)
+
+    local, backends = threading.local(), []
+
+    def reused(seed: int) -> float:
+        if not hasattr(local, 'backend'):
+            p, local.v, local.w = knapsack(n)
+            local.backend = GurobiBackend(p, pool=shared, reset=True)
+            backends.append(local.backend)
+        data = instance(n, seed)
+        return local.backend.update_params({local.v: data['v'], local.w: data['w']}).solve().x.sum()
+
+    import gurobipy
+    gurobipy.setParam('OutputFlag', 0)
+    gurobipy.setParam('Threads', 1)
+    print(f'{"mode":>8} {"requests":>9} {"time [s]":>9} {"models/min":>11}')
+    for mode, f in [('fresh', fresh), ('default', default), ('pooled', pooled), ('reused', reused)]:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.workers) as executor:
+            list(executor.map(f, range(args.requests)))
+        elapsed = time.perf_counter() - start
+        print(f'{mode:>8} {args.requests:>9} {elapsed:>9.2f} {args.requests / elapsed * 60:>11.0f}')
+    for backend in backends:
+        backend.dispose()
+    shared.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# Time to first solution with Backend.iter_solutions compared to the time solve() needs, on a multi-dimensional
+# knapsack (Gurobi incumbents) and a max-cut (AnnealBackend, one batch of reads at a time).
+#   PYTHONPATH=src python benchmarks/incumbents.py [--items 300] [--dims 20] [--time-limit 20] [--nodes 300]
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Callable
+
+import numpy as np
+
+from anneal import maxcut
+from backends.anneal import AnnealBackend
+from backends.model import Backend, Result
+from dsl.aggregators import Σ
+from dsl.core import BinVar
+from dsl.program import Max
+
+
+def knapsack(n: int, dims: int, seed: int = 0) -> tuple[Max, Callable[[Result], float]]:
+    rng = np.random.default_rng(seed)
+    w, v = rng.integers(10, 100, size=(dims, n)), rng.integers(10, 100, size=n)
+    x = BinVar.new(f'mk{n}_{{}}', n)
+    p = Max(Σ(range(n))(lambda i: int(v[i]) * x[i])) \
+        .st(([range(dims)], lambda d: (f'cap{d}', Σ(range(n))(lambda i: int(w[d, i]) * x[i]) <= int(w[d].sum() // 4))))
+    return p, lambda result: sum(int(v[i]) * result.values[x[i]] for i in range(n))
+
+
+def stream(name: str, backend: Backend, objective: Callable[[Result], float], **kwargs) -> None:
+    start, first, best, n = time.perf_counter(), None, -np.inf, 0
+    for n, result in enumerate(backend.iter_solutions(**kwargs), 1):
+        first = first or time.perf_counter() - start
+        best = max(best, objective(result))
+    print(f'{name:>10} {n:>10} {first:>12.3f} {time.perf_counter() - start:>10.3f} {best:>10.1f}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=300)
+    parser.add_argument('--dims', type=int, default=20)
+    parser.add_argument('--time-limit', type=float, default=20)
+    parser.add_argument('--nodes', type=int, default=300)
+    args = parser.parse_args()
+
+    print(f'{"backend":>10} {"solutions":>10} {"first [s]":>12} {"last [s]":>10} {"best":>10}')
+    try:
+        import gurobipy
+        from backends.gurobi import GurobiBackend
+        gurobipy.setParam('OutputFlag', 0)
+        gurobipy.setParam('TimeLimit', args.time_limit)
+        p, objective = knapsack(args.items, args.dims)
+        stream('gurobi', GurobiBackend(p), objective)
+    except ImportError:
+        print('gurobipy not installed, skipping')
+
+    backend = AnnealBackend(maxcut(args.nodes), num_reads=32, num_sweeps=500, seed=0)
+    stream('anneal', backend, lambda result: -result.energies.min(), chunk_size=8)
+
+
+if __name__ == '__main__':
+    main()
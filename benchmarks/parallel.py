@@ -0,0 +1,46 @@
+# Builds the row constraints of a dense n x n program serially (Program.st) and in chunks on a thread and a process
+# pool (Program.st_parallel). Threads only pay off on free-threaded CPython, with the GIL they show the overhead.
+#   PYTHONPATH=src python benchmarks/parallel.py [--n 300 600] [--workers 4] [--chunk-size 50]
+from __future__ import annotations
+
+import argparse
+import time
+from functools import partial
+
+import numpy as np
+
+from dsl.aggregators import Σ
+from dsl.core import BinVar
+from dsl.program import Min
+
+
+def row(cost: np.ndarray, x: dict, i: int) -> tuple:
+    return f'row{i}', Σ(range(len(cost)))(lambda j: int(cost[i, j]) * x[i][j]) <= int(cost[i].sum() // 2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n', type=int, nargs='+', default=[300, 600])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--chunk-size', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f'{"n":>6} {"mode":>10} {"constraints":>12} {"build [s]":>10}')
+    for n in args.n:
+        cost = np.random.default_rng(0).integers(1, 100, size=(n, n))
+        x = BinVar.new(f'pa{n}_{{}}_{{}}', n, n)
+        p, family = Min(x[0][0]), ([range(n)], partial(row, cost, x))
+        registry = {v.name: v for r in x.values() for v in r.values()}
+        for mode, build in [('serial', lambda: p.st(family)),
+                            ('threads', lambda: p.st_parallel(family, workers=args.workers, chunk_size=args.chunk_size)),
+                            ('processes', lambda: p.st_parallel(family, processes=True, workers=args.workers,
+                                                                chunk_size=args.chunk_size, vars=registry))]:
+            start = time.perf_counter()
+            q = build()
+            for c in q.constraints:  # serial st leaves the sums unexpanded
+                c.expr.vars(), c.expr.meta
+            print(f'{n:>6} {mode:>10} {len(q.constraints):>12} {time.perf_counter() - start:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# Builds a shift assignment over the valid (worker, shift) pairs only (IndexSet) and the way it had to be written
+# before: dense vars for every pair and an availability matrix multiplied in. Reports vars, expression nodes and time.
+#   PYTHONPATH=src python benchmarks/sparse.py [--workers 100 300] [--shifts 100] [--density 0.05]
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+
+from dsl.aggregators import Σ
+from dsl.core import BinVar
+from dsl.index import IndexSet
+from dsl.program import Min, Program
+
+
+def sparse(cost: np.ndarray, avail: np.ndarray) -> Program:
+    n, m = cost.shape
+    pairs = IndexSet(zip(*np.nonzero(avail)))
+    by_shift = pairs.project(1, 0)
+    x = BinVar.new(f'sp{n}_{{}}_{{}}', pairs)
+    return Min(Σ(pairs)(lambda w, s: int(cost[w, s]) * x[w, s])) \
+        .rcon(range(m))(lambda s: (f'cover{s}', Σ(by_shift[s])(lambda w: x[w, s]) >= 1)) \
+        .rcon(range(n))(lambda w: (f'load{w}', Σ(pairs[w])(lambda s: x[w, s]) <= 2))
+
+
+def dense(cost: np.ndarray, avail: np.ndarray) -> Program:
+    n, m = cost.shape
+    x = BinVar.new(f'de{n}_{{}}_{{}}', n, m)
+    return Min(Σ(range(n), range(m))(lambda w, s: int(cost[w, s]) * x[w][s])) \
+        .rcon(range(m))(lambda s: (f'cover{s}', Σ(range(n))(lambda w: int(avail[w, s]) * x[w][s]) >= 1)) \
+        .rcon(range(n))(lambda w: (f'load{w}', Σ(range(m))(lambda s: int(avail[w, s]) * x[w][s]) <= 2))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[100, 300])
+    parser.add_argument('--shifts', type=int, default=100)
+    parser.add_argument('--density', type=float, default=0.05)
+    args = parser.parse_args()
+
+    print(f'{"workers":>8} {"model":>7} {"vars":>8} {"nodes":>9} {"build [s]":>10}')
+    for n in args.workers:
+        rng = np.random.default_rng(0)
+        cost, avail = rng.integers(1, 10, size=(n, args.shifts)), rng.random((n, args.shifts)) < args.density
+        for name, build in [('sparse', sparse), ('dense', dense)]:
+            start = time.perf_counter()
+            p = build(cost, avail)
+            nodes = p.objective.size() + sum(c.expr.size() for c in p.constraints)
+            print(f'{n:>8} {name:>7} {len(p.vars):>8} {nodes:>9} {time.perf_counter() - start:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+# Measures the import time of a fresh interpreter for the DSL alone, the backend registry, a single backend resolved
+# through the registry and all solver libraries at once (which is what importing the backend modules used to cost).
+#   PYTHONPATH=src python benchmarks/startup.py [--runs 5]
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+Scenarios = {'dsl': 'import dsl.program, dsl.aggregators',
+             'registry': 'import dsl.program, dsl.aggregators, backends.registry',
+             'get_backend(highs)': 'import backends.registry as r; r.get_backend("highs")',
+             'get_backend(tabu)': 'import backends.registry as r; r.get_backend("tabu")',
+             'get_backend(tabu)._solver': 'import backends.registry as r; r.get_backend("tabu")._solver(None)',
+             'all solver libraries': 'import dsl.program, gurobipy, dimod, dwave.samplers, dwave.system, scipy.optimize'}
+
+
+def startup(code: str, runs: int) -> float:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True, env=os.environ)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    baseline = startup('pass', args.runs)
+    print(f'{"scenario":>28} {"startup [s]":>12} {"imports [s]":>12}')
+    for name, code in Scenarios.items():
+        t = startup(code, args.runs)
+        print(f'{name:>28} {t:>12.3f} {t - baseline:>12.3f}')
+
+
+if __name__ == '__main__':
+    main()
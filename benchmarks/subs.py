@@ -0,0 +1,39 @@
+# Fixes k vars of a long linear sum, once var by var with Expr.set (one replacing traversal per var, the way setn
+# used to work) and once with Expr.subs (a single traversal with a lookup by name, folding constants).
+#   PYTHONPATH=src python benchmarks/subs.py [--terms 200 500] [--fixed 10 50]
+from __future__ import annotations
+
+import argparse
+import time
+from functools import reduce
+
+from dsl.core import Var
+
+
+def timed(f):
+    start = time.perf_counter()
+    res = f()
+    return res, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--terms', type=int, nargs='+', default=[200, 500])
+    parser.add_argument('--fixed', type=int, nargs='+', default=[10, 50])
+    args = parser.parse_args()
+
+    print(f'{"terms":>8} {"fixed":>6} {"set [s]":>9} {"subs [s]":>9} {"nodes before":>13} {"nodes after":>12}')
+    for n in args.terms:
+        vs = [Var(f'su{n}_{i}') for i in range(n)]
+        expr = 0
+        for i, v in enumerate(vs):
+            expr = expr + (i % 7 + 1) * v
+        for k in args.fixed:
+            mapping = {v: 1 for v in vs[:k]}
+            _, serial = timed(lambda: reduce(lambda e, kv: e.set(*kv), mapping.items(), expr))
+            res, single = timed(lambda: expr.subs(mapping))
+            print(f'{n:>8} {k:>6} {serial:>9.3f} {single:>9.4f} {expr.size():>13} {res.size():>12}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# Measures size and speed of the wire format (dsl.wire) on an n x n assignment program, compared to the pickle of
+# the to_matrices export (the plain recursive pickle of such a program exceeds the recursion limit).
+#   PYTHONPATH=src python benchmarks/wire.py [--n 50 100]
+from __future__ import annotations
+
+import argparse
+import pickle
+import time
+
+import numpy as np
+
+from dsl.aggregators import Σ
+from dsl.core import BinVar
+from dsl.program import Min, Program
+
+
+def assignment(n: int, seed: int = 0) -> Program:
+    cost = np.random.default_rng(seed).integers(1, 100, size=(n, n))
+    x = BinVar.new(f'as{n}_{{}}_{{}}', n, n)
+    return Min(Σ(range(n), range(n))(lambda i, j: int(cost[i, j]) * x[i][j])) \
+        .st(([range(n)], lambda i: (f'row{i}', Σ(range(n))(lambda j: x[i][j]) == 1)),
+            ([range(n)], lambda j: (f'col{j}', Σ(range(n))(lambda i: x[i][j]) == 1)))
+
+
+def timed(f):
+    start = time.perf_counter()
+    res = f()
+    return res, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n', type=int, nargs='+', default=[50, 100])
+    args = parser.parse_args()
+
+    print(f'{"n":>5} {"format":>10} {"bytes":>10} {"dumps [s]":>10} {"loads [s]":>10}')
+    for n in args.n:
+        p = assignment(n)
+        data, dumps = timed(p.dumps)
+        _, loads = timed(lambda: Program.loads(data))
+        print(f'{n:>5} {"wire":>10} {len(data):>10} {dumps:>10.3f} {loads:>10.3f}')
+        data, dumps = timed(lambda: pickle.dumps(p.to_matrices()))
+        _, loads = timed(lambda: pickle.loads(data))
+        print(f'{n:>5} {"matrices":>10} {len(data):>10} {dumps:>10.3f} {loads:>10.3f}')
+
+
+if __name__ == '__main__':
+    main()
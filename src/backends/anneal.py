@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import math
+import time
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+from scipy import sparse
+
+from backends.model import Backend, Result, Status
+from dsl.program import Program
+from dsl.qubo import Qubo, to_qubo
+
+
+def beta_range(Q: sparse.csr_array) -> tuple[float, float]:
+    # Same heuristic as dwave-samplers: at the hottest beta the largest possible energy increase is accepted with
+    # probability 1/2, at the coldest beta the smallest one with probability 1/100
+    W = abs(sparse.csr_array(Q))
+    field = W.sum(axis=0) + W.sum(axis=1) - W.diagonal()
+    smallest = W.data[W.data > 0].min(initial=1.0)
+    return math.log(2) / max(field.max(initial=1.0), 1e-12), math.log(100) / smallest
+
+
+def beta_schedule(beta_range: tuple[float, float], num_sweeps: int, type: str = 'geometric') -> np.ndarray:
+    match type:
+        case 'geometric':
+            return np.geomspace(*beta_range, num=num_sweeps)
+        case 'linear':
+            return np.linspace(*beta_range, num=num_sweeps)
+        case _:
+            raise ValueError(f'Unknown beta schedule type \'{type}\'')
+
+
+def anneal(Q: sparse.csr_array, betas: np.ndarray, num_reads: int, seed: int | np.random.SeedSequence | None = None,
+           time_limit: float | None = None) -> tuple[np.ndarray, np.ndarray]:
+    # Metropolis sweeps over all vars for num_reads independent replicas at once. Per replica the local fields
+    # G = h + W @ x (W the symmetric off-diagonal part of Q, h its diagonal) are kept up to date, so the energy change
+    # of flipping x_i is s_i * G_i with s_i = 1 - 2 x_i and a flip only touches the row of W belonging to i.
+    start, rng, Q = time.perf_counter(), np.random.default_rng(seed), sparse.csr_array(Q)
+    off = sparse.triu(Q, k=1, format='csr')
+    W = (off + off.T).tocsr()
+    rows = [(W.indices[a:b], W.data[a:b, None]) for a, b in zip(W.indptr[:-1], W.indptr[1:])]
+    # Replicas are stored along the last axis, so that the state and fields of one var are contiguous
+    S = 1.0 - 2.0 * rng.integers(0, 2, size=(Q.shape[0], num_reads))
+    G = Q.diagonal()[:, None] + W @ ((1.0 - S) / 2)
+    for beta in betas:
+        # Metropolis acceptance exp(-beta * delta) > u  <=>  delta < -log(u) / beta
+        thresholds = -np.log(rng.random(S.shape)) / beta
+        for i, (cols, vals) in enumerate(rows):
+            flip = S[i] * G[i] < thresholds[i]
+            if flip.any():
+                d = S[i] * flip  # change of x_i
+                S[i] -= 2.0 * d
+                G[cols] += vals * d
+        if time_limit is not None and time.perf_counter() - start > time_limit:
+            break
+    X = (1.0 - S) / 2
+    return X.T.astype(np.int8), np.einsum('ij,ij->j', Q @ X, X)
+
+
+@dataclass
+class AnnealBackend(Backend[Qubo]):
+    p: Program
+    name: str = 'Anneal'
+    num_reads: int = 10
+    num_sweeps: int = 1000
+    beta_range: tuple[float, float] | None = None
+    beta_schedule_type: str = 'geometric'
+    seed: int | None = None
+    time_limit: float | None = None
+    workers: int = 1
+    lagrange: float | None = None
+
+    def _convert(self) -> Qubo:
+        return to_qubo(self.p, self.lagrange)
+
+    # Returns all samples (over the QUBO's labels, i.e. including slack bits) and their energies
+    def sample(self) -> tuple[np.ndarray, np.ndarray]:
+        betas = beta_schedule(self.beta_range or beta_range(self.p_.Q), self.num_sweeps, self.beta_schedule_type)
+        chunks = [len(c) for c in np.array_split(np.arange(self.num_reads), max(1, min(self.workers, self.num_reads)))]
+        seeds = np.random.SeedSequence(self.seed).spawn(len(chunks))
+        if len(chunks) == 1:
+            samples, energies = anneal(self.p_.Q, betas, self.num_reads, seeds[0], self.time_limit)
+        else:  # replicas are independent, so they are simply spread over processes
+            with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+                results = list(pool.map(anneal, [self.p_.Q] * len(chunks), [betas] * len(chunks), chunks, seeds, [self.time_limit] * len(chunks)))
+            samples, energies = np.concatenate([s for s, _ in results]), np.concatenate([e for _, e in results])
+        return samples, energies + self.p_.offset
+
+    def _result(self, samples: np.ndarray, energies: np.ndarray) -> Result:
+        samples = samples[:, :len(self.p_.vars)]  # without slack bits
+        return Result(Status.UNKNOWN, x=samples[energies.argmin()].astype(float), vars=self.p_.vars, samples=samples, energies=energies)
+
+    def _solve(self) -> Result:
+        return self._result(*self.sample())
+
+    # Runs the reads in batches of chunk_size (the last one holds the rest, spread over the workers) and yields a
+    # Result per batch as it completes, holding only that batch's samples
+    def iter_solutions(self, chunk_size: int = 1) -> Iterator[Result]:
+        if self.p.lazy_families:  # batches are only meaningful once no constraints are added anymore
+            yield self._run()
+            return
+        betas = beta_schedule(self.beta_range or beta_range(self.p_.Q), self.num_sweeps, self.beta_schedule_type)
+        chunks = [min(chunk_size, self.num_reads - start) for start in range(0, self.num_reads, chunk_size)]
+        seeds = np.random.SeedSequence(self.seed).spawn(len(chunks))
+        n = len(chunks)
+        if self.workers > 1:
+            pool = ProcessPoolExecutor(max_workers=min(self.workers, n))
+            results = pool.map(anneal, [self.p_.Q] * n, [betas] * n, chunks, seeds, [self.time_limit] * n)
+        else:
+            pool, results = None, map(anneal, [self.p_.Q] * n, [betas] * n, chunks, seeds, [self.time_limit] * n)
+        try:
+            for samples, energies in results:
+                yield self._result(samples, energies + self.p_.offset)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+    def model_as_str(self) -> str:
+        q, labels = self.p_.Q.tocoo(), self.p_.labels
+        return ' '.join([f'{self.p_.offset:g}'] + [f'{v:+g}*{labels[i]}' + ('' if i == j else f'*{labels[j]}') for i, j, v in zip(q.row, q.col, q.data)])
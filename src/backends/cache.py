@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Any, Protocol
+
+import numpy as np
+
+from backends.model import Backend, Result, Status
+from dsl.program import Program
+
+_Arrays = ('x', 'samples', 'energies', 'feasible')
+
+
+# A Result without its Var objects: the vars are stored by name and re-bound to the vars of the program asking for
+# it, so identical programs built from scratch (e.g. a retried request) share entries
+@dataclass
+class Entry:
+    status: Status
+    names: list[str]
+    arrays: dict[str, np.ndarray] = field(default_factory=dict)
+
+    @staticmethod
+    def of(result: Result) -> Entry:
+        return Entry(result.status, [v.name for v in result.vars],
+                     {a: getattr(result, a) for a in _Arrays if getattr(result, a) is not None})
+
+    # A copy whose arrays are not shared with the given entry (or the result it was made of)
+    def copy(self) -> Entry:
+        return Entry(self.status, list(self.names), {a: arr.copy() for a, arr in self.arrays.items()})
+
+    def result(self, p: Program) -> Result:
+        by_name = {v.name: v for v in p.vars}
+        return Result(self.status, vars=[by_name[name] for name in self.names], **self.arrays)
+
+
+class Store(Protocol):
+    def get(self, key: str) -> Entry | None: ...
+
+    def put(self, key: str, entry: Entry) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+# Entries are copied on put and get, so callers mutating a result (or the result an entry was made of) do not change
+# the cached arrays
+@dataclass
+class MemoryStore:
+    maxsize: int = 128
+
+    def __post_init__(self) -> None:
+        self._entries: OrderedDict[str, Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Entry | None:
+        with self._lock:
+            if (entry := self._entries.get(key)) is not None:
+                self._entries.move_to_end(key)
+        return entry and entry.copy()
+
+    def put(self, key: str, entry: Entry) -> None:
+        entry = entry.copy()
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# One .npz file per entry; reads touch the file, so evicting the files with the oldest mtime once the directory
+# exceeds max_bytes drops the least recently used entries. Files are written atomically, so several processes may
+# share a directory.
+@dataclass
+class DiskStore:
+    path: str | Path
+    max_bytes: int = 256 * 2 ** 20
+
+    def __post_init__(self) -> None:
+        self.path = Path(self.path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> Entry | None:
+        try:
+            with np.load(file := self.path / f'{key}.npz', allow_pickle=False) as data:
+                entry = Entry(Status[str(data['status'])], data['names'].tolist(), {a: data[a] for a in _Arrays if a in data})
+            os.utime(file)
+            return entry
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):  # missing, evicted meanwhile or unreadable
+            return None
+
+    def put(self, key: str, entry: Entry) -> None:
+        buf = io.BytesIO()
+        np.savez(buf, status=entry.status.name, names=np.array(entry.names, dtype=str), **entry.arrays)
+        tmp = self.path / f'{key}.{os.getpid()}.{threading.get_ident()}.tmp'
+        tmp.write_bytes(buf.getvalue())
+        os.replace(tmp, self.path / f'{key}.npz')
+        self._evict()
+
+    def _evict(self) -> None:
+        files = []
+        for file in self.path.glob('*.npz'):
+            try:
+                files.append((file.stat().st_mtime, file.stat().st_size, file))
+            except FileNotFoundError:
+                pass
+        total = sum(size for _, size, _ in files)
+        for _, size, file in sorted(files):
+            if total <= self.max_bytes:
+                break
+            file.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self) -> None:
+        for file in self.path.glob('*.npz'):
+            file.unlink(missing_ok=True)
+
+
+def _stable(value: Any) -> bool:
+    match value:
+        case None | bool() | int() | float() | str() | bytes():
+            return True
+        case tuple() | list() | frozenset():
+            return all(_stable(v) for v in value)
+        case dict():
+            return all(_stable(k) and _stable(v) for k, v in value.items())
+        case _:
+            return False
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    bypassed: int = 0  # programs with lazy constraint families, see ResultCache.key
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0
+
+
+# Opt-in cache of solve results: on a hit neither expansion and conversion nor the solver run happen, e.g.
+#   cache = ResultCache(DiskStore('.results'))
+#   result = cache.solve('gurobi', p)  # or a backend class, settings are passed as keyword arguments
+@dataclass
+class ResultCache:
+    store: Store = field(default_factory=MemoryStore)
+    stats: CacheStats = field(default_factory=CacheStats)
+
+    # Content hash of the program (structure, coefficients, bounds, var types and bound parameter values via the wire
+    # format, vars in name order and without their current values) together with the backend class and its settings.
+    # Any change of these gives a new key, so stale entries are never hit. Lazy families are functions whose content
+    # cannot be hashed, their programs have no key. Settings which do not change the result (Backend._unkeyed, e.g. an
+    # env pool) are left out, the others need a stable repr, i.e. plain values and containers of them.
+    @staticmethod
+    def key(cls: type[Backend], p: Program, settings: dict[str, Any]) -> str | None:
+        if p.lazy_families:
+            return None
+        settings = {f.name: getattr(cls, f.name, None) for f in fields(cls) if f.name != 'p' and not f.name.startswith('_')} | settings
+        settings = {name: value for name, value in settings.items() if name not in cls._unkeyed}
+        for name, value in settings.items():
+            if not _stable(value):
+                raise TypeError(f'Setting {name} of {cls.__name__} has no stable key: {type(value).__name__}')
+        h = hashlib.sha256(p.copy(vars=sorted(p.vars, key=lambda v: v.name)).dumps(solution=False))
+        h.update(f'{cls.__module__}:{cls.__qualname__}'.encode())
+        h.update(repr(sorted(settings.items())).encode())
+        return h.hexdigest()
+
+    def solve(self, backend: type[Backend] | str, p: Program, mutate_vars: bool = False, **settings) -> Result:
+        if isinstance(backend, str):
+            from backends.registry import get_backend
+            backend = get_backend(backend)
+        if (key := ResultCache.key(backend, p, settings)) is None:
+            self.stats.bypassed += 1
+            return backend(p, **settings).solve(mutate_vars)
+        if (entry := self.store.get(key)) is not None:
+            self.stats.hits += 1
+            result = entry.result(p)
+        else:
+            self.stats.misses += 1
+            result = backend(p, **settings).solve()
+            self.store.put(key, Entry.of(result))
+        if mutate_vars and result.x is not None:
+            result.write_back()
+        return result
+
+    def clear(self) -> None:
+        self.store.clear()
+        self.stats = CacheStats()
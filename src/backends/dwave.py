@@ -1,50 +1,94 @@
 from __future__ import annotations
 
 from abc import ABC
+from collections.abc import Iterator
 from dataclasses import dataclass
-from typing import Callable
+from typing import Callable, ClassVar, TYPE_CHECKING
 
-import dimod
-from dimod import ExactSolver, ExactCQMSolver, RandomSampler, SimulatedAnnealingSampler, ConstrainedQuadraticModel, QuadraticModel
-from dwave.samplers import PlanarGraphSolver, SteepestDescentSolver, TabuSampler, TreeDecompositionSolver
-from dwave.system import LeapHybridCQMSampler, LeapHybridSampler
+import numpy as np
 
 from backends.model import Backend, Result, Status, VarReplacementTraverser
 from dsl.core import VarType
 from dsl.program import Program
 from utils.utils import ident
 
+# dimod and the samplers are only imported once a backend converts a program or creates its sampler, importing this
+# module is cheap (in particular dwave.system pulls in the whole Leap cloud client)
+if TYPE_CHECKING:
+    import dimod
+    from dimod import ConstrainedQuadraticModel, QuadraticModel
+
 
 @dataclass
-class LeapCQMBackend(Backend[ConstrainedQuadraticModel], ABC):
+class LeapCQMBackend(Backend['ConstrainedQuadraticModel'], ABC):
     p: Program
     name: str = ''
     _inverter: Callable[[dict[str, float]], dict[str, float]] = ident
+    _batched: ClassVar[bool] = False  # local stochastic samplers, see iter_solutions
 
     def _convert(self) -> ConstrainedQuadraticModel:
+        import dimod
+
         var_type_map = {VarType.BINARY: dimod.Binary,
                        VarType.INT: dimod.Integer,
                        VarType.CONTINUOUS: dimod.Real}
 
-        self.cqm = ConstrainedQuadraticModel()
-        vars_dict = {v: var_type_map.get(v.type, dimod.Real)(v.name) for v in self.p.vars}
-        traverser = VarReplacementTraverser(vars_dict)
+        self.cqm = dimod.ConstrainedQuadraticModel()
+        self._vars = {v: var_type_map.get(v.type, dimod.Real)(v.name) for v in self.p.vars}
+        self.vars = list(self._vars)
+        traverser = VarReplacementTraverser(self._vars)
 
-        self.cqm.set_objective(self.p.objective.traverse(traverser).expr)
-        for name, c in [(c.name, c.expr.traverse(traverser).expr) for c in self.p.constraints]:
-            self.cqm.add_constraint(c, label=name, weight=None)
+        self.cqm.set_objective((obj := self.p.objective.traverse(traverser)).expr)
+        self._parametric_obj = obj.parametric
+        self._parametric = []
+        for c, t in [(c, c.expr.traverse(traverser)) for c in self.p.constraints]:
+            self.cqm.add_constraint(t.expr, label=c.name, weight=None)
+            if t.parametric:
+                self._parametric.append(c)
 
         return self.cqm
 
-    def _solve(self) -> Result:
-        return Result(Status.UNKNOWN, self._inverter(self._sample(self._solver()).first.sample))
+    def _update(self) -> None:
+        traverser = VarReplacementTraverser(self._vars)
+        if self._parametric_obj:
+            self.cqm.set_objective(self.p.objective.traverse(traverser).expr)
+        for c in self._parametric:
+            self.cqm.remove_constraint(c.name)
+            self.cqm.add_constraint(c.expr.traverse(traverser).expr, label=c.name, weight=None)
 
-    _sample = lambda self, solver: solver.sample_cqm(self.p_)
+    def _solve(self) -> Result:
+        return self._result(self._sample(self._solver()))
+
+    # Keep the whole sample set, as arrays aligned to the program's vars
+    def _result(self, sampleset: dimod.SampleSet) -> Result:
+        samples, record = self._invert(sampleset), sampleset.record
+        feasible = record.is_feasible if 'is_feasible' in record.dtype.names else None
+        return Result(Status.UNKNOWN, x=samples[Result.best(samples, record.energy, feasible)].astype(float), vars=self.vars,
+                      samples=samples, energies=record.energy, feasible=feasible)
+
+    def _invert(self, sampleset: dimod.SampleSet) -> np.ndarray:
+        cols = {label: i for i, label in enumerate(sampleset.variables)}
+        return sampleset.record.sample[:, [cols[v.name] for v in self.vars]]
+
+    # Local stochastic samplers are run in batches of chunk_size reads, each batch yields a Result holding its samples.
+    # Deterministic solvers (every batch would repeat the same enumeration) and remote ones (every batch would be a
+    # separate cloud job) run once and yield that Result with all its samples.
+    def iter_solutions(self, num_reads: int = 10, chunk_size: int = 1) -> Iterator[Result]:
+        if not self._batched or self.p.lazy_families:  # batches are only meaningful once no constraints are added anymore
+            yield self._run()
+            return
+        solver = self._solver()
+        for start in range(0, num_reads, chunk_size):
+            yield self._result(self._sample(solver, num_reads=min(chunk_size, num_reads - start)))
+
+    _sample = lambda self, solver, **kwargs: solver.sample_cqm(self.p_, **kwargs)
 
     def cqm_as_str(self) -> str:
+        import dimod
         return dimod.lp.dumps(self.cqm)
 
     def bqm_as_str(self) -> str:
+        import dimod
         return dimod.cqm_to_bqm(self.cqm)[0].to_polystring()
 
     def model_as_str(self) -> str:
@@ -53,52 +97,114 @@ class LeapCQMBackend(Backend[ConstrainedQuadraticModel], ABC):
 
 @dataclass
 class LeapBQMBackend(LeapCQMBackend):
+    lagrange: float | None = None  # penalty strength, defaults to 10x the largest objective bias
+
     def _convert(self) -> QuadraticModel:  # will not typecheck
+        import dimod
+        from dsl.qubo import to_qubo
+
+        # Programs over binary vars only are compiled straight into a QUBO instead of going through a CQM
+        if self.p.is_bqm():
+            self.cqm, qubo = None, to_qubo(self.p, self.lagrange)
+            self.bqm = dimod.BinaryQuadraticModel.from_numpy_vectors(qubo.linear, ((q := qubo.quadratic).row, q.col, q.data), qubo.offset,
+                                                                     dimod.BINARY, variable_order=qubo.labels)
+            self._inverter, self.vars = qubo.invert, qubo.vars
+            return self.bqm
         cqm = super()._convert()
-        self.bqm, self._inverter = dimod.cqm_to_bqm(cqm)
+        self.bqm, self._inverter = dimod.cqm_to_bqm(cqm, self.lagrange)
         return self.bqm
 
-    _sample = lambda self, solver: solver.sample(self.p_)
+    def _update(self) -> None:
+        if self.cqm is None:  # compiling the QUBO is cheap enough to simply redo it
+            self.p_ = self._convert()
+            return
+        import dimod
+
+        super()._update()
+        self.bqm, self._inverter = dimod.cqm_to_bqm(self.cqm, self.lagrange)
+        self.p_ = self.bqm
+
+    def _invert(self, sampleset: dimod.SampleSet) -> np.ndarray:
+        if self.cqm is None:  # the QUBO's labels start with the program's vars
+            return super()._invert(sampleset)
+        return np.array([[sample[v.name] for v in self.vars] for sample in map(self._inverter, sampleset.samples())])
+
+    def cqm_as_str(self) -> str:
+        return super().cqm_as_str() if self.cqm is not None else LeapCQMBackend(self.p).cqm_as_str()
+
+    def bqm_as_str(self) -> str:
+        return self.bqm.to_polystring()
+
+    _sample = lambda self, solver, **kwargs: solver.sample(self.p_, **kwargs)
 
 
 class HybridBQMBackend(LeapBQMBackend):
     name: str = 'HybridBQMBackend'
-    _solver = lambda self: LeapHybridSampler()
+
+    def _solver(self):
+        from dwave.system import LeapHybridSampler
+        return LeapHybridSampler()
 
 
 class HybridCQMBackend(LeapCQMBackend):
     name: str = 'HybridCQMBackend'
-    _solver = lambda self: LeapHybridCQMSampler()
+
+    def _solver(self):
+        from dwave.system import LeapHybridCQMSampler
+        return LeapHybridCQMSampler()
 
 
 class ExactBQMBackend(LeapBQMBackend):
-    _solver = lambda self: ExactSolver()
+    def _solver(self):
+        from dimod import ExactSolver
+        return ExactSolver()
 
 
 class ExactCQMBackend(LeapCQMBackend):
-    _solver = lambda self: ExactCQMSolver()
+    def _solver(self):
+        from dimod import ExactCQMSolver
+        return ExactCQMSolver()
 
 
 class RandomBQMBackend(LeapBQMBackend):
-    _solver = lambda self: RandomSampler()
+    _batched = True
+
+    def _solver(self):
+        from dimod import RandomSampler
+        return RandomSampler()
 
 
 class SimulatedAnnealingBQMBackend(LeapBQMBackend):
-    _solver = lambda self: SimulatedAnnealingSampler()
+    _batched = True
+
+    def _solver(self):
+        from dimod import SimulatedAnnealingSampler
+        return SimulatedAnnealingSampler()
 
 
 class PlanarGraphBQMBackend(LeapBQMBackend):
-    _solver = lambda self: PlanarGraphSolver()
+    def _solver(self):
+        from dwave.samplers import PlanarGraphSolver
+        return PlanarGraphSolver()
 
 
 class SteepestDescentBQMBackend(LeapBQMBackend):
-    _solver = lambda self: SteepestDescentSolver()
+    _batched = True
+
+    def _solver(self):
+        from dwave.samplers import SteepestDescentSolver
+        return SteepestDescentSolver()
 
 
 class TabuBQMBackend(LeapBQMBackend):
-    _solver = lambda self: TabuSampler()
+    _batched = True
 
+    def _solver(self):
+        from dwave.samplers import TabuSampler
+        return TabuSampler()
 
-class TreeDecompositionBQMBackend(LeapBQMBackend):
-    _solver = lambda self: TreeDecompositionSolver()
 
+class TreeDecompositionBQMBackend(LeapBQMBackend):
+    def _solver(self):
+        from dwave.samplers import TreeDecompositionSolver
+        return TreeDecompositionSolver()
@@ -1,15 +1,20 @@
 from __future__ import annotations
 
 import os
-from dataclasses import dataclass
+import queue
+import threading
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
 from datetime import datetime
+from typing import Any, ClassVar, Self
 
 import gurobipy
+import numpy as np
 from gurobipy import GRB
 
 from backends.model import Backend, Status, Result, VarReplacementTraverser
-from dsl.core import VarType
-from dsl.program import Program
+from dsl.core import VarType, Eq, LE, GE
+from dsl.program import Program, Constraint
 
 _StatusMap = {GRB.OPTIMAL: Status.OPTIMAL,
               GRB.SUBOPTIMAL: Status.SUBOPTIMAL,
@@ -22,27 +27,243 @@ _VarTypeMap = {VarType.BINARY: GRB.BINARY,
                VarType.INT: GRB.INTEGER,
                VarType.CONTINUOUS: GRB.CONTINUOUS}
 
+_SenseMap = {Eq: GRB.EQUAL,
+             LE: GRB.LESS_EQUAL,
+             GE: GRB.GREATER_EQUAL}
 
+
+# A pool of started Gurobi environments for services solving many (small) models. Each profile names a set of
+# parameters (e.g. {'Threads': 1, 'TimeLimit': 10, 'MIPGap': 1e-3, 'OutputFlag': 0}) with which up to size envs
+# are started, on demand and only once. Models inherit the parameters of their env, so environment and log setup
+# are not paid per solve. Backends check an env out and return it on dispose, checkout blocks (up to timeout,
+# then queue.Empty) while all envs of a profile are in use.
+@dataclass
+class EnvPool:
+    profiles: dict[str, dict[str, Any]] = field(default_factory=lambda: {'default': {}})
+    size: int = 1
+
+    def __post_init__(self) -> None:
+        self._idle = {profile: queue.LifoQueue() for profile in self.profiles}
+        self._started = dict.fromkeys(self.profiles, 0)
+        self._profile_of: dict[int, str] = {}
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def checkout(self, profile: str = 'default', timeout: float | None = None) -> gurobipy.Env:
+        if profile not in self.profiles:
+            raise KeyError(f'Unknown profile \'{profile}\', available are: {", ".join(self.profiles)}')
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('The pool is closed')
+            if start := self._idle[profile].empty() and self._started[profile] < self.size:
+                self._started[profile] += 1
+        return self._start(profile) if start else self._idle[profile].get(timeout=timeout)
+
+    # Envs returned to a closed pool are disposed instead of being queued again
+    def checkin(self, env: gurobipy.Env) -> None:
+        with self._lock:
+            if not self._closed:
+                self._idle[self._profile_of[id(env)]].put(env)
+                return
+            self._profile_of.pop(id(env), None)
+        env.dispose()
+
+    def _start(self, profile: str) -> gurobipy.Env:
+        try:
+            env = gurobipy.Env(empty=True)
+            for param, value in self.profiles[profile].items():
+                env.setParam(param, value)
+            env.start()
+        except BaseException:
+            with self._lock:
+                self._started[profile] -= 1
+            raise
+        with self._lock:
+            self._profile_of[id(env)] = profile
+        return env
+
+    # Disposes the idle envs right away, the ones still checked out once they are returned
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            for idle in self._idle.values():
+                while not idle.empty():
+                    env = idle.get_nowait()
+                    self._profile_of.pop(id(env), None)
+                    env.dispose()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# Without a pool, models use Gurobi's default env. With reset, a reused backend (see update_params) solves from
+# scratch instead of warm starting from the previous solution.
 @dataclass
 class GurobiBackend(Backend[gurobipy.Model]):
     p: Program
     name: str = 'Gurobi'
+    pool: EnvPool | None = None
+    profile: str = 'default'
+    reset: bool = False
+    _unkeyed: ClassVar[frozenset[str]] = frozenset({'name', 'pool'})  # results are cached per profile name
+
+    def __post_init__(self) -> None:
+        self._env = self.pool.checkout(self.profile) if self.pool is not None else None
+        try:
+            super().__post_init__()
+        except BaseException:  # the model is disposed by _convert already, the env goes back to the pool
+            self._checkin()
+            raise
 
+    # A model whose conversion fails is disposed right away
     def _convert(self) -> gurobipy.Model:
-        model = gurobipy.Model()
-        traverser = VarReplacementTraverser({v: model.addVar(name=v.name, vtype=_VarTypeMap.get(v.type, GRB.CONTINUOUS), lb=v.lb, ub=v.ub) for v in self.p.vars})
+        model = gurobipy.Model(env=self._env)
+        try:
+            return self._build(model)
+        except BaseException:
+            model.dispose()
+            raise
 
-        model.setObjective(self.p.objective.traverse(traverser).expr)
-        for name, c in [(c.name, c.expr.traverse(traverser).expr) for c in self.p.constraints]:
-            model.addConstr(c, name)
+    def _build(self, model: gurobipy.Model) -> gurobipy.Model:
+        self._vars = {v: model.addVar(name=v.name, vtype=_VarTypeMap.get(v.type, GRB.CONTINUOUS), lb=v.lb, ub=v.ub) for v in self.p.vars}
+        traverser = VarReplacementTraverser(self._vars)
+
+        model.setObjective((obj := self.p.objective.traverse(traverser)).expr)
+        self._parametric_obj = obj.parametric
+        # Remember which constraints depend on parameters, only those have to be patched by update_params
+        self._parametric = []
+        for c, t in [(c, c.expr.traverse(traverser)) for c in self.p.constraints]:
+            constr = model.addConstr(t.expr, c.name)
+            if t.parametric:
+                self._parametric.append((c, constr))
+        if self.p.lazy_families:
+            model.Params.LazyConstraints = 1
 
         return model
 
-    def _solve(self) -> Result:
-        self.p_.optimize()
+    def _update(self) -> None:
+        traverser = VarReplacementTraverser(self._vars)
+        if self._parametric_obj:
+            self.p_.setObjective(self.p.objective.traverse(traverser).expr)
+        self.p_.update()
+        self._parametric = [(c, self._patch(c, constr, traverser)) for c, constr in self._parametric]
+        self.p_.update()
+
+    def _patch(self, c: Constraint, constr: gurobipy.Constr, traverser: VarReplacementTraverser) -> gurobipy.Constr:
+        match constr:
+            case gurobipy.Constr():  # linear constraints are patched coefficient-wise: lhs - rhs (sense) 0
+                row, lhs = self.p_.getRow(constr), gurobipy.LinExpr() + (c.expr.left - c.expr.right).traverse(traverser).expr
+                coeffs = dict.fromkeys([row.getVar(i) for i in range(row.size())], 0.0)
+                for i in range(lhs.size()):
+                    coeffs[lhs.getVar(i)] = coeffs.get(lhs.getVar(i), 0.0) + lhs.getCoeff(i)
+                for var, coeff in coeffs.items():
+                    self.p_.chgCoeff(constr, var, coeff)
+                constr.RHS, constr.Sense = -lhs.getConstant(), _SenseMap[type(c.expr)]
+                return constr
+            case _:  # quadratic constraints cannot be patched in place, so they are replaced
+                self.p_.remove(constr)
+                return self.p_.addConstr(c.expr.traverse(traverser).expr, c.name)
+
+    def _result(self) -> Result:
         return Result(status=(status := _StatusMap.get(self.p_.status, Status.UNKNOWN)),
-                      values=dict(zip(self.p_.getAttr('VarName', self.p_.getVars()),
-                                      self.p_.getAttr('X', self.p_.getVars()))) if Status.has_result(status) else None)
+                      x=np.array(self.p_.getAttr('X', list(self._vars.values()))) if Status.has_result(status) and self.p_.SolCount else None,
+                      vars=list(self._vars))
+
+    # Every new incumbent is checked against the lazy constraint families first, violated constraints are added via
+    # cbLazy (which rejects the incumbent), accepted ones are passed on to on_incumbent
+    def _callback(self, on_incumbent: Callable[[Result], None] | None = None) -> Callable[[gurobipy.Model, int], None]:
+        vars, traverser = list(self._vars.values()), VarReplacementTraverser(self._vars)
+
+        def callback(model: gurobipy.Model, where: int) -> None:
+            if where != GRB.Callback.MIPSOL:
+                return
+            incumbent = Result(Status.SUBOPTIMAL, x=np.array(model.cbGetSolution(vars)), vars=list(self._vars))
+            if cuts := self.p.violated(incumbent.values):
+                if new := {v.name for c in cuts for v in c.expr.vars() if v not in self._vars}:
+                    # gurobipy ignores exceptions raised in callbacks, so the error is raised after optimize, see _optimize
+                    self._error = ValueError(f'Lazy constraints added in a callback cannot introduce new vars: {", ".join(sorted(new))}')
+                    model.terminate()
+                    return
+                for c in cuts:
+                    model.cbLazy(c.expr.traverse(traverser).expr)
+            elif on_incumbent is not None:
+                on_incumbent(incumbent)
+
+        return callback
+
+    # Lazy constraints are handled in the MIPSOL callback, which Gurobi only calls for MIPs
+    def _native_lazy(self) -> bool:
+        self.p_.update()
+        return self.p_.IsMIP == 1
+
+    def _solve(self) -> Result:
+        if self.reset:
+            self.p_.reset()
+        if self.p.lazy_families and self._native_lazy():
+            self._optimize(self._callback())
+        else:
+            self.p_.optimize()
+        return self._result()
+
+    def _optimize(self, callback: Callable[[gurobipy.Model, int], None]) -> None:
+        self._error = None
+        self.p_.optimize(callback)
+        if self._error is not None:
+            raise self._error
+
+    def _add(self, constraints: list[Constraint]) -> None:
+        for v in {v for c in constraints for v in c.expr.vars()} - self._vars.keys():
+            self._vars[v] = self.p_.addVar(name=v.name, vtype=_VarTypeMap.get(v.type, GRB.CONTINUOUS), lb=v.lb, ub=v.ub)
+        traverser = VarReplacementTraverser(self._vars)
+        for c in constraints:
+            self.p_.addConstr(c.expr.traverse(traverser).expr, c.name)
+
+    # The optimization runs in a thread, the MIPSOL callback hands each new incumbent over through a queue
+    def iter_solutions(self) -> Iterator[Result]:
+        if self.p.lazy_families and not self._native_lazy():
+            yield self._run()
+            return
+        incumbents = queue.Queue()
+        callback = self._callback(incumbents.put)
+
+        def optimize() -> None:
+            try:
+                self._optimize(callback)
+                incumbents.put(self._result())
+            except Exception as e:
+                incumbents.put(e)
+            incumbents.put(None)
+
+        thread = threading.Thread(target=optimize, daemon=True)
+        thread.start()
+        try:
+            while (item := incumbents.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:  # also reached if the consumer stops early
+            if thread.is_alive():
+                self.p_.terminate()
+            thread.join()
+
+    # Frees the model (and returns the env to its pool) now instead of whenever the garbage collector gets to it
+    def dispose(self) -> None:
+        self.p_.dispose()
+        self._checkin()
+
+    def _checkin(self) -> None:
+        if self._env is not None:
+            self.pool.checkin(self._env)
+            self._env = None
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.dispose()
 
     def model_as_str(self) -> str:
         # Unfortunately, Gurobi offers no easy way to get the model as a string, so let's do it the rough way: write it into a tmp file, return the content and remove the file ;-)
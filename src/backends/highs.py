@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import ClassVar
+
+import numpy as np
+from scipy.optimize import Bounds, LinearConstraint, linprog, milp
+
+from backends.model import Backend, Result, Status
+from dsl.matrices import Matrices
+from dsl.program import Kind, Program
+
+# Status codes shared by scipy.optimize.milp and scipy.optimize.linprog
+_StatusMap = {0: Status.OPTIMAL,
+              1: Status.LIMIT_REACHED,
+              2: Status.INFEASIBLE,
+              3: Status.NO_SOLUTION,  # unbounded
+              4: Status.UNKNOWN}
+
+_LPSenseMap = {'<': '<=', '>': '>=', '=': '='}
+
+
+@dataclass
+class ScipyMilpBackend(Backend[Matrices]):
+    p: Program
+    name: str = 'HiGHS'
+    time_limit: float | None = None
+    mip_rel_gap: float | None = None
+    presolve: bool = True
+    disp: bool = False
+    _unkeyed: ClassVar[frozenset[str]] = frozenset({'name', 'disp'})
+
+    def _convert(self) -> Matrices:
+        if self.p.kind not in (Kind.LP, Kind.MILP):  # checked before anything is exported
+            raise ValueError(f'{self.name} only supports linear programs, got {self.p.kind.value}')
+        return self.p.to_matrices()
+
+    def _options(self, **kwargs) -> dict:
+        return {k: v for k, v in dict(disp=self.disp, presolve=self.presolve, time_limit=self.time_limit, **kwargs).items() if v is not None}
+
+    # Pure LPs go to linprog, which wants the rows split into A_ub @ x <= b_ub and A_eq @ x == b_eq
+    def _linprog(self, m: Matrices):
+        ub, eq = np.flatnonzero(m.sense != '='), np.flatnonzero(m.sense == '=')
+        sign = np.where(m.sense[ub] == '>', -1.0, 1.0)
+        return linprog(m.c, A_ub=m.A[ub].multiply(sign[:, None]).tocsr() if ub.size else None, b_ub=m.rhs[ub] * sign if ub.size else None,
+                       A_eq=m.A[eq] if eq.size else None, b_eq=m.rhs[eq] if eq.size else None,
+                       bounds=np.column_stack((m.lb, m.ub)), method='highs', options=self._options())
+
+    def _milp(self, m: Matrices):
+        return milp(m.c, integrality=(m.types != 'C').astype(np.uint8), bounds=Bounds(m.lb, m.ub),
+                    constraints=LinearConstraint(m.A, np.where(m.sense == '<', -np.inf, m.rhs), np.where(m.sense == '>', np.inf, m.rhs)) if m.A.shape[0] else None,
+                    options=self._options(mip_rel_gap=self.mip_rel_gap))
+
+    def _solve(self) -> Result:
+        res = self._linprog(self.p_) if self.p_.is_continuous() else self._milp(self.p_)
+        if (status := _StatusMap.get(res.status, Status.UNKNOWN)) == Status.LIMIT_REACHED and res.x is None:  # no incumbent yet
+            status = Status.NO_SOLUTION
+        return Result(status=status, x=res.x if Status.has_result(status) else None, vars=self.p_.vars)
+
+    def model_as_str(self) -> str:
+        m = self.p_
+        terms = lambda cols, coeffs: ' '.join(f'{c:+g} {m.vars[j].name}' for j, c in zip(cols, coeffs)) or '0'
+        rows = [f' {m.names[i]}: {terms(m.A.indices[m.A.indptr[i]:m.A.indptr[i + 1]], m.A.data[m.A.indptr[i]:m.A.indptr[i + 1]])} {_LPSenseMap[s]} {r:g}'
+                for i, (s, r) in enumerate(zip(m.sense, m.rhs))]
+        return '\n'.join(['Minimize', f' obj: {terms(np.flatnonzero(m.c), m.c[m.c != 0])}' + (f' {m.c0:+g}' if m.c0 else ''), 'Subject To', *rows,
+                          'Bounds', *[f' {lb:g} <= {v.name} <= {ub:g}' for v, lb, ub in zip(m.vars, m.lb, m.ub)],
+                          'Generals', *[f' {v.name}' for v, t in zip(m.vars, m.types) if t == 'I'],
+                          'Binaries', *[f' {v.name}' for v, t in zip(m.vars, m.types) if t == 'B'], 'End'])
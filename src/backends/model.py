@@ -1,12 +1,16 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from collections.abc import Iterator, Mapping, Sequence
+from dataclasses import dataclass, replace
 from enum import Enum, auto
-from typing import Any, TypeVar, Generic, Self
+from functools import cached_property
+from typing import Any, ClassVar, TypeVar, Generic, Self
 
-from dsl.core import Var, Traverser, Expr, Const, Aggregator, Op
-from dsl.program import Program
+import numpy as np
+
+from dsl.core import Var, Traverser, Expr, Const, Aggregator, Op, Param
+from dsl.program import Program, Constraint
 from utils.utils import Copyable
 
 
@@ -17,16 +21,60 @@ class Status(Enum):
     LIMIT_REACHED = auto()
     UNKNOWN = auto()
     NO_SOLUTION = auto()
+    LAZY_VIOLATED = auto()  # the solution still violates lazy constraints the solver was given, see Backend._cutting_planes
 
     @staticmethod
     def has_result(status: Status) -> bool:
         return status in [Status.OPTIMAL, Status.SUBOPTIMAL, Status.LIMIT_REACHED]
 
 
+# Read-only name-keyed view on a solution array (Vars are accepted as keys, too); the index is only built on first access
+@dataclass(eq=False)
+class Values(Mapping[str, float]):
+    x: np.ndarray
+    vars: Sequence[Var]
+
+    @cached_property
+    def _index(self) -> dict[str, int]:
+        return {v.name: i for i, v in enumerate(self.vars)}
+
+    def __getitem__(self, key: str | Var) -> float:
+        return self.x[self._index[key.name if isinstance(key, Var) else key]].item()
+
+    def __iter__(self) -> Iterator[str]:
+        return (v.name for v in self.vars)
+
+    def __len__(self) -> int:
+        return len(self.vars)
+
+
+# Solutions are stored as arrays aligned to vars: x is the best solution, samples/energies/feasible hold all
+# solutions of multi-sample backends (one row per sample)
 @dataclass
 class Result:
     status: Status = Status.UNKNOWN
-    values: dict[Var, float] | None = None
+    x: np.ndarray | None = None
+    vars: Sequence[Var] = ()
+    samples: np.ndarray | None = None
+    energies: np.ndarray | None = None
+    feasible: np.ndarray | None = None
+
+    @cached_property
+    def values(self) -> Values | None:
+        return Values(self.x, self.vars) if self.x is not None else None
+
+    @cached_property
+    def by_var(self) -> dict[Var, float] | None:
+        return dict(zip(self.vars, self.x.tolist())) if self.x is not None else None
+
+    def write_back(self) -> None:
+        for var, val in zip(self.vars, self.x.tolist()):
+            var.val = val  # side-effect
+
+    @staticmethod
+    def best(samples: np.ndarray, energies: np.ndarray, feasible: np.ndarray | None = None) -> int:
+        # lowest energy among the feasible samples (if any), otherwise among all
+        return int(np.argmin(np.where(feasible, energies, np.inf)) if feasible is not None and feasible.any() else np.argmin(energies))
 
 
 # class Solver(ABC):
@@ -40,6 +88,7 @@ BMT = TypeVar('BackendModelType')
 class Backend(ABC, Generic[BMT]):
     p: Program
     name: str
+    _unkeyed: ClassVar[frozenset[str]] = frozenset({'name'})  # settings which do not change results, see ResultCache.key
 
     def __post_init__(self) -> None:
         self.p_ = self._convert()
@@ -48,12 +97,53 @@ class Backend(ABC, Generic[BMT]):
         raise NotImplementedError
 
     def solve(self, mutate_vars: bool = False) -> Result:
-        result = self._solve()
-        if mutate_vars and result.values:
-            for var in self.p.vars:
-                var.val = result.values[var.name]  # side-effect
+        result = self._run()
+        if mutate_vars and result.x is not None:
+            result.write_back()
         return result
 
+    # Solutions as they are found: for MIP solvers the incumbents, the last one being the final result; for samplers
+    # run in batches the samples of each batch, so the best solution is the best over all yielded results. Closing the
+    # generator early stops the solver. By default there is only the final result.
+    def iter_solutions(self) -> Iterator[Result]:
+        yield self._run()
+
+    def _run(self) -> Result:
+        return self._cutting_planes() if self.p.lazy_families and not self._native_lazy() else self._solve()
+
+    # Whether the solver handles the program's lazy constraint families itself (e.g. in a callback)
+    def _native_lazy(self) -> bool:
+        return False
+
+    # Lazy constraint families as an outer loop: solve, add the violated constraints and solve again until none are
+    # violated. Vars which only occur in cuts are added to the program (and by _add to the model). If the families
+    # only return constraints which were added already (e.g. a heuristic backend ignoring them), the solution is
+    # reported as LAZY_VIOLATED instead of with the solver's status.
+    def _cutting_planes(self) -> Result:
+        while (result := self._solve()).x is not None:
+            if not (violated := self.p.violated(result.values)):
+                break
+            names = {c.name for c in self.p.constraints}
+            if not (cuts := [c for c in violated if c.name not in names]):
+                return replace(result, status=Status.LAZY_VIOLATED)
+            self.p = self.p._add(cuts)
+            self._add(cuts)
+        return result
+
+    # Backends which cannot add constraints to their model simply convert it again
+    def _add(self, constraints: list[Constraint]) -> None:
+        self.p_ = self._convert()
+
+    # Re-bind parameters and patch the already converted model instead of rebuilding it
+    def update_params(self, params: dict) -> Self:
+        self.p.bind(params)
+        self._update()
+        return self
+
+    # Backends which cannot patch their model in place simply convert it again
+    def _update(self) -> None:
+        self.p_ = self._convert()
+
     @abstractmethod
     def model_as_str(self) -> str:
         raise NotImplementedError
@@ -65,15 +155,20 @@ CVT = TypeVar('ConvertedVarType')
 class VarReplacementTraverser(Traverser, Copyable, Generic[CVT]):
     vars: dict[Var, CVT]
     expr: Expr | None = None
+    parametric: bool = False  # whether the converted expression depends on a Param
 
     def const(self, c: Const) -> Self:
         return self.copy(expr=c.value)
 
+    def param(self, p: Param) -> Self:
+        return self.copy(expr=p.get(), parametric=True)
+
     def var(self, v: Var) -> Self:
         return self.copy(expr=self.vars[v])
 
     def op(self, op: Op, left: Self, right: Self) -> Self:
-        return self.copy(expr=op.op(left.expr, right.expr))
+        return self.copy(expr=op.op(left.expr, right.expr), parametric=left.parametric or right.parametric)
 
     def agg(self, a: Aggregator) -> Self:
-        return self.copy(expr=a.expr().traverse(VarReplacementTraverser[CVT](vars=self.vars)).expr)
+        inner = a.expr().traverse(VarReplacementTraverser[CVT](vars=self.vars))
+        return self.copy(expr=inner.expr, parametric=inner.parametric)
@@ -1,6 +1,8 @@
 from dataclasses import dataclass
 from typing import Iterable
 
+import numpy as np
+
 from backends.model import Backend, Result, Status
 from dsl.core import Var
 from dsl.program import Program
@@ -26,7 +28,7 @@ class NOP(Backend[Program]):
         return self.p
 
     def _solve(self) -> Result:
-        return Result(status=Status.OPTIMAL, values={v: 0.0 for v in self.p.vars})
+        return Result(status=Status.OPTIMAL, x=np.zeros(len(vars := list(self.p.vars))), vars=vars)
 
     def model_as_str(self) -> str:
         return ''
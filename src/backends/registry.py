@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from importlib import import_module
+from importlib.util import find_spec
+
+from backends.model import Backend
+from dsl.program import Kind, Program
+
+# Backends are registered by name as 'module:Class' and only imported (together with their solver library) on first
+# use. Other packages can add backends via entry points in this group, e.g. in their pyproject.toml:
+#   [project.entry-points.'hermeneutics.backends']
+#   mysolver = 'mypackage.backend:MySolverBackend'
+ENTRY_POINT_GROUP = 'hermeneutics.backends'
+
+_Builtins = {'nop': 'backends.nop:NOP',
+             'gurobi': 'backends.gurobi:GurobiBackend',
+             'highs': 'backends.highs:ScipyMilpBackend',
+             'anneal': 'backends.anneal:AnnealBackend',
+             'hybrid-bqm': 'backends.dwave:HybridBQMBackend',
+             'hybrid-cqm': 'backends.dwave:HybridCQMBackend',
+             'exact': 'backends.dwave:ExactBQMBackend',
+             'exact-cqm': 'backends.dwave:ExactCQMBackend',
+             'random': 'backends.dwave:RandomBQMBackend',
+             'sa': 'backends.dwave:SimulatedAnnealingBQMBackend',
+             'planar': 'backends.dwave:PlanarGraphBQMBackend',
+             'steepest-descent': 'backends.dwave:SteepestDescentBQMBackend',
+             'tabu': 'backends.dwave:TabuBQMBackend',
+             'tree-decomposition': 'backends.dwave:TreeDecompositionBQMBackend'}
+
+_registry: dict[str, str | type[Backend]] = dict(_Builtins)
+_entry_points_loaded = False
+
+
+def register(name: str, backend: str | type[Backend]) -> None:
+    _registry[name] = backend
+
+
+def _load_entry_points() -> None:
+    # Reading the installed distributions' metadata is not free either, so it is only done once a name is missing
+    global _entry_points_loaded
+    if not _entry_points_loaded:
+        from importlib.metadata import entry_points
+
+        for ep in entry_points(group=ENTRY_POINT_GROUP):
+            _registry.setdefault(ep.name, ep.value)
+        _entry_points_loaded = True
+
+
+def available() -> list[str]:
+    _load_entry_points()
+    return sorted(_registry)
+
+
+def get_backend(name: str) -> type[Backend]:
+    if name not in _registry:
+        _load_entry_points()
+    match _registry.get(name):
+        case None:
+            raise KeyError(f'Unknown backend \'{name}\', available are: {", ".join(available())}')
+        case str(target):
+            module, _, cls = target.partition(':')
+            backend = _registry[name] = getattr(import_module(module), cls)
+            return backend
+        case backend:
+            return backend
+
+
+# A default backend by the kind of program: HiGHS for linear programs and Gurobi for everything else. Programs which
+# compile into a QUBO only go to the (heuristic) annealer if Gurobi is not installed.
+def route(p: Program) -> type[Backend]:
+    match p.kind:
+        case Kind.LP | Kind.MILP:
+            return get_backend('highs')
+        case _ if p.is_bqm() and find_spec('gurobipy') is None:
+            return get_backend('anneal')
+        case _:
+            return get_backend('gurobi')
@@ -0,0 +1,53 @@
+# Runs backends on the reference instances and prints a table, optionally writing the records to JSON/CSV:
+#   PYTHONPATH=src python -m bench --backends gurobi highs sa tabu [--instances knapsack maxcut] [--seed 0]
+#       [--repeat 1] [--settings '{"sa": {"seed": 0}}'] [--no-memory] [--json out.json] [--csv out.csv]
+from __future__ import annotations
+
+import argparse
+import json
+
+from backends.registry import available
+from bench.harness import run, to_csv, to_json
+from bench.instances import Library
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='python -m bench')
+    parser.add_argument('--backends', nargs='+', required=True, help=f'any of {", ".join(available())}')
+    parser.add_argument('--instances', nargs='+', choices=list(Library), default=list(Library))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--settings', type=json.loads, default={}, help='constructor settings per backend as JSON')
+    parser.add_argument('--no-memory', action='store_true', help='skip the (traced) memory measurement run')
+    parser.add_argument('--json')
+    parser.add_argument('--csv')
+    args = parser.parse_args()
+
+    if 'gurobi' in args.backends:  # the solver log would drown the table
+        try:
+            import gurobipy
+            gurobipy.setParam('OutputFlag', 0)
+        except ImportError:
+            pass  # recorded as error of the gurobi runs
+
+    instances = [Library[name](seed=args.seed) for name in args.instances]
+    records = run(instances, {b: args.settings.get(b, {}) for b in args.backends}, args.repeat, not args.no_memory)
+
+    print(f'{"instance":>16} {"backend":>18} {"status":>14} {"convert [s]":>12} {"solve [s]":>10} {"memory [kB]":>12} '
+          f'{"objective":>10} {"optimum":>10} {"gap":>8} {"feasible":>9}')
+    for r in records:
+        if r.error:
+            print(f'{r.instance:>16} {r.backend:>18}  {r.error}')
+            continue
+        fmt = lambda value, spec: format(value, spec) if value is not None else '-'
+        print(f'{r.instance:>16} {r.backend:>18} {r.status:>14} {fmt(r.convert_time, ">12.4f")} {fmt(r.solve_time, ">10.4f")} '
+              f'{fmt(r.peak_memory and r.peak_memory / 1024, ">12.1f")} {fmt(r.objective, ">10.1f")} '
+              f'{fmt(r.optimum, ">10.1f")} {fmt(r.gap, ">8.3f")} {str(r.feasible):>9}')
+    if args.json:
+        to_json(records, args.json)
+    if args.csv:
+        to_csv(records, args.csv)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import csv
+import json
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict, fields
+from typing import Any, Iterable
+
+from backends.model import Backend, Result, Values
+from backends.registry import get_backend
+from bench.instances import Instance
+from dsl.core import Const, Eq, LE, GE
+from dsl.program import Program
+
+
+# One run of a backend on an instance. Times are wall-clock seconds, the peak memory is what the Python allocator saw
+# during conversion and solve (tracemalloc, measured in a separate run so that the times are not affected by tracing;
+# native allocations of solver libraries are not included). gap is relative to the known optimum.
+@dataclass
+class Record:
+    instance: str
+    backend: str
+    status: str = ''
+    convert_time: float | None = None
+    solve_time: float | None = None
+    peak_memory: int | None = None
+    objective: float | None = None
+    optimum: float | None = None
+    gap: float | None = None
+    feasible: bool | None = None
+    error: str = ''
+
+
+# Objective value in the sense of the problem (Max objectives are stored negated), None if some var has no value
+def objective(p: Program, values: Values) -> float | None:
+    match value := p.objective.subs(dict(values)):
+        case Const():
+            return -float(value.value) if p.max else float(value.value)
+        case _:
+            return None
+
+
+def feasible(p: Program, values: Values, tol: float = 1e-6) -> bool:
+    mapping = dict(values)
+    for c in p.constraints:
+        match slack := (c.expr.left - c.expr.right).subs(mapping):
+            case Const() if type(c.expr) is Eq and abs(slack.value) <= tol:
+                continue
+            case Const() if type(c.expr) is LE and slack.value <= tol:
+                continue
+            case Const() if type(c.expr) is GE and slack.value >= -tol:
+                continue
+            case _:
+                return False
+    return not p.violated(values)
+
+
+def _convert_and_solve(cls: type[Backend], p: Program, settings: dict[str, Any]) -> tuple[float, float, Result]:
+    start = time.perf_counter()
+    backend = cls(p, **settings)
+    converted = time.perf_counter()
+    result = backend.solve()
+    return converted - start, time.perf_counter() - converted, result
+
+
+def run_one(instance: Instance, backend: str, settings: dict[str, Any] | None = None, memory: bool = True) -> Record:
+    record, settings = Record(instance.name, backend, optimum=instance.optimum), settings or {}
+    try:
+        cls = get_backend(backend)
+        record.convert_time, record.solve_time, result = _convert_and_solve(cls, instance.p, settings)
+        if memory:
+            tracemalloc.start()
+            try:
+                _convert_and_solve(cls, instance.p, settings)
+                record.peak_memory = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+    except Exception as e:  # e.g. a backend which does not support the kind of program or a missing solver library
+        record.error = f'{type(e).__name__}: {e}'
+        return record
+
+    record.status = result.status.name
+    if result.values is not None:
+        record.objective, record.feasible = objective(instance.p, result.values), feasible(instance.p, result.values)
+        if record.objective is not None and instance.optimum is not None:
+            record.gap = abs(record.objective - instance.optimum) / max(abs(instance.optimum), 1e-9)
+    return record
+
+
+# Runs every backend (a name from the registry, optionally with constructor settings) on every instance, repeat times
+def run(instances: Iterable[Instance], backends: Iterable[str] | dict[str, dict[str, Any]], repeat: int = 1,
+        memory: bool = True) -> list[Record]:
+    backends = backends if isinstance(backends, dict) else {b: {} for b in backends}
+    return [run_one(instance, backend, settings, memory)
+            for instance in instances for backend, settings in backends.items() for _ in range(repeat)]
+
+
+def to_json(records: list[Record], path: str) -> None:
+    with open(path, 'w') as file:
+        json.dump([asdict(r) for r in records], file, indent=2)
+
+
+def to_csv(records: list[Record], path: str) -> None:
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=[f.name for f in fields(Record)])
+        writer.writeheader()
+        writer.writerows(asdict(r) for r in records)
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import itertools
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+from dsl.aggregators import Σ
+from dsl.core import BinVar
+from dsl.program import Max, Min, Program
+
+
+# A seeded reference problem written in the DSL together with its known optimum (in the sense of the problem, i.e.
+# not negated for Max). The optima are computed independently of the program (DP, Hungarian method, enumeration or by
+# construction), the default sizes are small enough for exhaustive backends like exact-cqm.
+@dataclass
+class Instance:
+    name: str
+    p: Program
+    optimum: float | None = None
+
+
+def knapsack(n: int = 12, seed: int = 0) -> Instance:
+    rng = np.random.default_rng(seed)
+    v, w = rng.integers(10, 100, size=n), rng.integers(5, 50, size=n)
+    capacity = int(w.sum() // 3)
+    # DP over the integer capacities
+    best = np.zeros(capacity + 1, dtype=np.int64)
+    for i in range(n):
+        best[w[i]:] = np.maximum(best[w[i]:], best[:capacity + 1 - w[i]] + v[i])
+    x = BinVar.new(f'kn{seed}_{n}_{{}}', n)
+    p = Max(Σ(range(n))(lambda i: int(v[i]) * x[i])).st(Σ(range(n))(lambda i: int(w[i]) * x[i]) <= capacity)
+    return Instance(f'knapsack-{n}', p, float(best[capacity]))
+
+
+def assignment(n: int = 4, seed: int = 0) -> Instance:
+    from scipy.optimize import linear_sum_assignment
+    cost = np.random.default_rng(seed).integers(1, 100, size=(n, n))
+    rows, cols = linear_sum_assignment(cost)
+    x = BinVar.new(f'as{seed}_{n}_{{}}_{{}}', n, n)
+    p = Min(Σ(range(n), range(n))(lambda i, j: int(cost[i, j]) * x[i][j])) \
+        .st(([range(n)], lambda i: (f'row{i}', Σ(range(n))(lambda j: x[i][j]) == 1)),
+            ([range(n)], lambda j: (f'col{j}', Σ(range(n))(lambda i: x[i][j]) == 1)))
+    return Instance(f'assignment-{n}', p, float(cost[rows, cols].sum()))
+
+
+def _graph(n: int, degree: int, rng: np.random.Generator) -> list[tuple[int, int]]:
+    return sorted({tuple(sorted(e)) for e in rng.integers(0, n, size=(n * degree // 2, 2)).tolist() if e[0] != e[1]})
+
+
+def maxcut(n: int = 12, degree: int = 4, seed: int = 0) -> Instance:
+    edges = _graph(n, degree, np.random.default_rng(seed))
+    # Enumeration of all cuts (node 0 stays on one side)
+    sides = (np.arange(2 ** (n - 1))[:, None] >> np.arange(n - 1)) & 1
+    sides = np.hstack([np.zeros((len(sides), 1), dtype=sides.dtype), sides])
+    u, v = np.array(edges).T
+    x = BinVar.new(f'mc{seed}_{n}_{{}}', n)
+    p = Max(Σ(edges)(lambda e: x[e[0]] + x[e[1]] - 2 * x[e[0]] * x[e[1]]))
+    return Instance(f'maxcut-{n}', p, float((sides[:, u] != sides[:, v]).sum(axis=1).max()))
+
+
+# A graph with a planted k-colouring that contains a k-clique, so its chromatic number is k
+def colouring(n: int = 5, k: int = 3, seed: int = 0) -> Instance:
+    rng = np.random.default_rng(seed)
+    colour = np.concatenate([np.arange(k), rng.integers(0, k, size=n - k)])
+    edges = sorted({(u, v) for u, v in itertools.combinations(range(n), 2)
+                    if colour[u] != colour[v] and (max(u, v) < k or rng.random() < 0.5)})
+    x, y = BinVar.new(f'co{seed}_{n}_{{}}_{{}}', n, k), BinVar.new(f'cu{seed}_{n}_{{}}', k)
+    p = Min(Σ(range(k))(lambda c: y[c])) \
+        .st(([range(n)], lambda u: (f'one{u}', Σ(range(k))(lambda c: x[u][c]) == 1)),
+            ([edges, range(k)], lambda e, c: (f'edge{e[0]}_{e[1]}_{c}', x[e[0]][c] + x[e[1]][c] <= 1)),
+            ([range(n), range(k)], lambda u, c: (f'used{u}_{c}', x[u][c] - y[c] <= 0)))
+    return Instance(f'colouring-{n}', p, float(k))
+
+
+# Uncapacitated facility location, the optimum enumerates the sets of open facilities
+def facility_location(m: int = 3, n: int = 4, seed: int = 0) -> Instance:
+    rng = np.random.default_rng(seed)
+    opening, cost = rng.integers(20, 60, size=m), rng.integers(1, 30, size=(m, n))
+    optimum = min(opening[list(s)].sum() + cost[list(s)].min(axis=0).sum()
+                  for r in range(1, m + 1) for s in itertools.combinations(range(m), r))
+    y, x = BinVar.new(f'fo{seed}_{m}_{{}}', m), BinVar.new(f'fa{seed}_{m}_{{}}_{{}}', m, n)
+    p = Min(Σ(range(m))(lambda i: int(opening[i]) * y[i]) + Σ(range(m), range(n))(lambda i, j: int(cost[i, j]) * x[i][j])) \
+        .st(([range(n)], lambda j: (f'serve{j}', Σ(range(m))(lambda i: x[i][j]) == 1)),
+            ([range(m), range(n)], lambda i, j: (f'open{i}_{j}', x[i][j] - y[i] <= 0)))
+    return Instance(f'facility-{m}x{n}', p, float(optimum))
+
+
+Library: dict[str, Callable[..., Instance]] = {'knapsack': knapsack,
+                                               'assignment': assignment,
+                                               'maxcut': maxcut,
+                                               'colouring': colouring,
+                                               'facility': facility_location}
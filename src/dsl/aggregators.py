@@ -3,31 +3,34 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Iterable, Callable
 
-from dsl.core import Aggregator, V
+from dsl.core import Aggregator, Const, V
 from utils.utils import ident, isum, iprod
 
 
-@dataclass
+@dataclass(eq=False)
 class Sum(Aggregator):
+    where: Callable[..., bool] | None = None
+
     def __post_init__(self):
-        self.expr = lambda: isum(V(*self.lst)(self.f))
+        # Sparse index sets (or a where filtering everything) may leave nothing to sum up
+        self.expr = lambda: isum(terms) if (terms := V(*self.lst, where=self.where)(self.f)) else Const(0)
 
 
-def rsum(*it: Iterable[float]) -> Callable[[Callable[[float], float]], Sum]:
-    return lambda f=ident: Sum(lst=it, f=f)
+def rsum(*it: Iterable[float], where: Callable[..., bool] | None = None) -> Callable[[Callable[[float], float]], Sum]:
+    return lambda f=ident: Sum(lst=it, f=f, where=where)
 
 
 Σ = Sigma = rsum
 
 
-def sum(*it: Iterable[float]) -> Sum:
-    return Σ(*it)()
+def sum(*it: Iterable[float], where: Callable[..., bool] | None = None) -> Sum:
+    return Σ(*it, where=where)()
 
 
 σ = sigma = sum
 
 
-@dataclass
+@dataclass(eq=False)
 class Dot(Aggregator):
     def __post_init__(self):
         self.expr = lambda: Σ(*[zip(*self.lst)])(iprod).expr()
@@ -40,7 +43,7 @@ def dot(*it: Iterable[int]) -> Dot:
 o = dot
 
 
-@dataclass
+@dataclass(eq=False)
 class Mult(Aggregator):
     def __post_init__(self):
         self.expr = lambda: iprod(V(*self.lst)(self.f))
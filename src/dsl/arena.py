@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import operator
+from dataclasses import dataclass, field
+from enum import IntEnum
+from numbers import Number
+from typing import Iterable
+
+import numpy as np
+
+from dsl.core import Expr, Op, Add, Sub, Mul, Pow, Eq, LT, LE, GT, GE, Const, Param, Var, Aggregator
+
+
+class Opcode(IntEnum):
+    CONST = 0
+    VAR = 1
+    PARAM = 2
+    ADD = 3
+    SUB = 4
+    MUL = 5
+    POW = 6
+    EQ = 7
+    LT = 8
+    LE = 9
+    GT = 10
+    GE = 11
+
+
+_OpcodeMap = {Add: Opcode.ADD, Sub: Opcode.SUB, Mul: Opcode.MUL, Pow: Opcode.POW,
+              Eq: Opcode.EQ, LT: Opcode.LT, LE: Opcode.LE, GT: Opcode.GT, GE: Opcode.GE}
+_ClassMap = {opcode: cls for cls, opcode in _OpcodeMap.items()}
+_Binary = {Opcode.ADD: operator.add, Opcode.SUB: operator.sub, Opcode.MUL: operator.mul, Opcode.POW: operator.pow,
+           Opcode.EQ: operator.eq, Opcode.LT: operator.lt, Opcode.LE: operator.le, Opcode.GT: operator.gt, Opcode.GE: operator.ge}
+_Comparisons = {Opcode.EQ, Opcode.LT, Opcode.LE, Opcode.GT, Opcode.GE}
+
+
+# Struct-of-arrays storage for expressions: node i is (op[i], left[i], right[i]), 9 bytes per node. Leaves have no
+# children and use left as index into values (CONST), vars (VAR) or params (PARAM) instead. Nodes are only ever
+# appended, so children always have smaller indices than their parents and every traversal is a plain loop.
+@dataclass(eq=False)
+class Arena:
+    capacity: int = 1024
+    size: int = field(default=0, init=False)
+    vars: list[Var] = field(default_factory=list, init=False)
+    params: list[Param] = field(default_factory=list, init=False)
+
+    def __post_init__(self) -> None:
+        self.op = np.empty(self.capacity, dtype=np.int8)
+        self.left = np.empty(self.capacity, dtype=np.int32)
+        self.right = np.empty(self.capacity, dtype=np.int32)
+        # The constant pool grows like the node arrays (by doubling), values is the used part of it
+        self._values, self._n_values = np.empty(16), 0
+        # Leaves are shared: name -> node of every var and param, value -> node of every constant
+        self._vars: dict[str, int] = {}
+        self._params: dict[str, int] = {}
+        self._consts: dict[float, int] = {}
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[:self._n_values]
+
+    @values.setter
+    def values(self, values: np.ndarray) -> None:
+        self._values, self._n_values = np.asarray(values, dtype=float), len(values)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a[:self.size].nbytes for a in (self.op, self.left, self.right)) + self.values.nbytes
+
+    def _grow(self) -> None:
+        self.capacity *= 2
+        for name in ('op', 'left', 'right'):
+            new = np.empty(self.capacity, dtype=(old := getattr(self, name)).dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def node(self, op: Opcode, left: int, right: int = -1) -> int:
+        if self.size == self.capacity:
+            self._grow()
+        i, self.size = self.size, self.size + 1
+        self.op[i], self.left[i], self.right[i] = op, left, right
+        return i
+
+    def const(self, value: float) -> ArenaExpr:
+        # Constants are shared, but coefficient-heavy models may still have many distinct ones
+        if (i := self._consts.get(value)) is None:
+            if self._n_values == len(self._values):
+                self._values = np.concatenate([self._values, np.empty(max(len(self._values), 16))])
+            i = self._consts[value] = self.node(Opcode.CONST, self._n_values)
+            self._values[self._n_values], self._n_values = value, self._n_values + 1
+        return ArenaExpr(self, i)
+
+    def var(self, v: Var) -> ArenaExpr:
+        if (i := self._vars.get(v.name)) is None:
+            i = self._vars[v.name] = self.node(Opcode.VAR, len(self.vars))
+            self.vars.append(v)
+        return ArenaExpr(self, i)
+
+    def param(self, p: Param) -> ArenaExpr:
+        if (i := self._params.get(p.name)) is None:
+            i = self._params[p.name] = self.node(Opcode.PARAM, len(self.params))
+            self.params.append(p)
+        return ArenaExpr(self, i)
+
+    def lift(self, obj: ArenaExpr | Expr | Number) -> ArenaExpr:
+        match obj:
+            case ArenaExpr():
+                return obj
+            case Number():
+                return self.const(obj)
+            case Var():
+                return self.var(obj)
+            case Param():
+                return self.param(obj)
+            case _:  # Expr
+                return self.from_expr(obj)
+
+    def sum(self, terms: Iterable[ArenaExpr | Expr | Number]) -> ArenaExpr:
+        it = iter(terms)
+        acc = self.lift(next(it, 0)).id
+        for t in it:
+            acc = self.node(Opcode.ADD, acc, self.lift(t).id)
+        return ArenaExpr(self, acc)
+
+    def from_expr(self, expr: Expr) -> ArenaExpr:
+        # Iterative post-order over the tree; shared subtrees are stored once, aggregators are expanded
+        memo, expanded, todo = {}, {}, [(expr, False)]
+        while todo:
+            node, visited = todo.pop()
+            if id(node) in memo:
+                continue
+            match node:
+                case Op() if visited:
+                    memo[id(node)] = self.node(_OpcodeMap[type(node)], memo[id(node.left)], memo[id(node.right)])
+                case Op():
+                    todo += [(node, True), (node.right, False), (node.left, False)]
+                case Aggregator() if visited:
+                    memo[id(node)] = memo[id(expanded[id(node)])]
+                case Aggregator():
+                    expanded[id(node)] = node.expr()
+                    todo += [(node, True), (expanded[id(node)], False)]
+                case Number():
+                    memo[id(node)] = self.const(node).id
+                case Const():
+                    memo[id(node)] = self.const(node.value).id
+                case _:  # Var, Param
+                    memo[id(node)] = self.lift(node).id
+        return ArenaExpr(self, memo[id(expr)])
+
+    def reachable(self, *roots: int) -> np.ndarray:
+        n = max(roots) + 1
+        reach = np.zeros(n, dtype=bool)
+        reach[list(roots)] = True
+        left, right = self.left[:n].tolist(), self.right[:n].tolist()
+        for i in range(n - 1, -1, -1):
+            if reach[i] and right[i] >= 0:
+                reach[left[i]] = reach[right[i]] = True
+        return reach
+
+    # Converts several roots at once, sharing one sweep over the arrays (and the Expr nodes of shared subtrees)
+    def to_exprs(self, roots: list[int]) -> list[Expr]:
+        if not roots:
+            return []
+        n = max(roots) + 1
+        op, left, right, values = self.op[:n].tolist(), self.left[:n].tolist(), self.right[:n].tolist(), self.values.tolist()
+        res = [None] * n
+        for i in np.flatnonzero(self.reachable(*roots)).tolist():
+            match op[i]:
+                case Opcode.CONST:
+                    res[i] = Const(values[left[i]])
+                case Opcode.VAR:
+                    res[i] = self.vars[left[i]]
+                case Opcode.PARAM:
+                    res[i] = self.params[left[i]]
+                case o:
+                    res[i] = _ClassMap[o](left=res[left[i]], right=res[right[i]])
+        return [res[r] for r in roots]
+
+
+@dataclass(eq=False, slots=True)
+class ArenaExpr:
+    arena: Arena
+    id: int
+
+    def _node(self, op: Opcode, other: ArenaExpr | Expr | Number, reverse: bool = False) -> ArenaExpr:
+        other = self.arena.lift(other).id
+        return ArenaExpr(self.arena, self.arena.node(op, other, self.id) if reverse else self.arena.node(op, self.id, other))
+
+    def __add__(self, other: ArenaExpr | Expr | Number) -> ArenaExpr:
+        return self._node(Opcode.ADD, other)
+
+    def __radd__(self, other: ArenaExpr | Expr | Number) -> ArenaExpr:
+        return self._node(Opcode.ADD, other, reverse=True)
+
+    def __sub__(self, other: ArenaExpr | Expr | Number) -> ArenaExpr:
+        return self._node(Opcode.SUB, other)
+
+    def __rsub__(self, other: ArenaExpr | Expr | Number) -> ArenaExpr:
+        return self._node(Opcode.SUB, other, reverse=True)
+
+    def __mul__(self, other: ArenaExpr | Expr | Number) -> ArenaExpr:
+        return self._node(Opcode.MUL, other)
+
+    def __rmul__(self, other: ArenaExpr | Expr | Number) -> ArenaExpr:
+        return self._node(Opcode.MUL, other, reverse=True)
+
+    def __pow__(self, power: ArenaExpr | Expr | Number, modulo=None) -> ArenaExpr:
+        return self._node(Opcode.POW, power)
+
+    def __eq__(self, other: ArenaExpr | Expr | Number) -> ArenaExpr:
+        return self._node(Opcode.EQ, other)
+
+    def __lt__(self, other: ArenaExpr | Expr | Number) -> ArenaExpr:
+        return self._node(Opcode.LT, other)
+
+    def __gt__(self, other: ArenaExpr | Expr | Number) -> ArenaExpr:
+        return self._node(Opcode.GT, other)
+
+    def __le__(self, other: ArenaExpr | Expr | Number) -> ArenaExpr:
+        return self._node(Opcode.LE, other)
+
+    def __ge__(self, other: ArenaExpr | Expr | Number) -> ArenaExpr:
+        return self._node(Opcode.GE, other)
+
+    def __neg__(self) -> ArenaExpr:
+        return -1 * self
+
+    def __pos__(self) -> ArenaExpr:
+        return self
+
+    __hash__ = object.__hash__
+
+    def size(self) -> int:
+        return int(self.arena.reachable(self.id).sum())
+
+    def vars(self) -> set[Var]:
+        a = self.arena
+        refs = a.left[:self.id + 1][a.reachable(self.id) & (a.op[:self.id + 1] == Opcode.VAR)]
+        return {a.vars[r] for r in refs.tolist()}
+
+    def evaluate(self, x: np.ndarray | None = None) -> float:
+        # x holds the values of arena.vars, by default the vars' current val is used
+        a, n = self.arena, self.id + 1
+        x = np.array([v.val or 0.0 for v in a.vars]) if x is None else x
+        op, left, right, values = a.op[:n].tolist(), a.left[:n].tolist(), a.right[:n].tolist(), a.values.tolist()
+        res = [0.0] * n
+        for i in np.flatnonzero(a.reachable(self.id)).tolist():
+            match op[i]:
+                case Opcode.CONST:
+                    res[i] = values[left[i]]
+                case Opcode.VAR:
+                    res[i] = float(x[left[i]])
+                case Opcode.PARAM:
+                    res[i] = a.params[left[i]].get()
+                case o:
+                    res[i] = _Binary[o](res[left[i]], res[right[i]])
+        return res[self.id]
+
+    def linear(self) -> tuple[np.ndarray, np.ndarray, float]:
+        # Compile a linear expression into (var refs, coefficients, constant) with two sweeps over the arrays:
+        # forward to find constant subtrees (and their values), backward to push coefficients down to the leaves.
+        # For a constraint (comparison at the root) the result is the one of lhs - rhs.
+        a, n = self.arena, self.id + 1
+        op, left, right, values = a.op[:n].tolist(), a.left[:n].tolist(), a.right[:n].tolist(), a.values.tolist()
+        reach = a.reachable(self.id).tolist()
+        const = [None] * n
+        for i in range(n):
+            if not reach[i]:
+                continue
+            match op[i]:
+                case Opcode.CONST:
+                    const[i] = values[left[i]]
+                case Opcode.PARAM:
+                    const[i] = float(a.params[left[i]].get())
+                case Opcode.VAR:
+                    pass
+                case o if const[left[i]] is not None and const[right[i]] is not None:
+                    const[i] = _Binary[o](const[left[i]], const[right[i]])
+
+        coeff, offset = [0.0] * n, 0.0
+        coeff[self.id] = 1.0
+        for i in range(self.id, -1, -1):
+            if not reach[i] or not (c := coeff[i]):
+                continue
+            if const[i] is not None:
+                offset += c * const[i]
+                continue
+            match op[i]:
+                case Opcode.VAR:
+                    pass
+                case Opcode.ADD:
+                    coeff[left[i]] += c
+                    coeff[right[i]] += c
+                case Opcode.SUB:
+                    coeff[left[i]] += c
+                    coeff[right[i]] -= c
+                case o if o in _Comparisons and i == self.id:
+                    coeff[left[i]] += c
+                    coeff[right[i]] -= c
+                case Opcode.MUL if const[left[i]] is not None:
+                    coeff[right[i]] += c * const[left[i]]
+                case Opcode.MUL if const[right[i]] is not None:
+                    coeff[left[i]] += c * const[right[i]]
+                case Opcode.POW if const[right[i]] == 1:
+                    coeff[left[i]] += c
+                case _:
+                    raise ValueError('Only linear expressions can be compiled directly on the arena')
+
+        refs = [(left[i], coeff[i]) for i in range(n) if op[i] == Opcode.VAR and reach[i] and coeff[i]]
+        return np.array([r for r, _ in refs], dtype=np.int64), np.array([c for _, c in refs], dtype=float), offset
+
+    def to_expr(self) -> Expr:
+        return self.arena.to_exprs([self.id])[0]
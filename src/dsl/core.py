@@ -1,18 +1,18 @@
 from __future__ import annotations
 
 import itertools
+import math
 import sys
+import threading
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from enum import Enum
-from functools import reduce
 from numbers import Number
-from typing import ClassVar, TypeAlias, TypeVar, Iterable, Callable, Self
-
-from tail_recurse import tail_call
+from typing import Any, ClassVar, TypeAlias, TypeVar, Iterable, Callable, Self
 
+from dsl.index import IndexSet, expand
 from dsl.tree import Tree
-from utils.utils import Deque, ident
+from utils.utils import ident
 
 
 @dataclass(eq=False)
@@ -74,27 +74,35 @@ class Expr(Tree, ABC):
         return self
 
     def traverse(self, t: Traverser) -> Traverser:
-
-        def match(x, stack: Deque) -> Traverser:
+        # Post-order with an explicit stack of the children's results, local to the call
+        stack = []
+        for x in self.postorder():
             match x:
                 case Const():
-                    return t.const(x)
+                    stack.append(t.const(x))
+                case Param():
+                    stack.append(t.param(x))
                 case Var():
-                    return t.var(x)
+                    stack.append(t.var(x))
                 case Aggregator():
-                    return t.agg(x)
+                    stack.append(t.agg(x))
                 case Op():
-                    return t.op(x, *reversed((stack.pop(), stack.pop())))  # right first, then left
-
-        go = tail_call(lambda unseen, stack=Deque(): stack.pop() if not unseen else go(unseen, stack + match(unseen.popleft(), stack)))
-
-        return go(self.postorder())
+                    right, left = stack.pop(), stack.pop()
+                    stack.append(t.op(x, left, right))
+        return stack.pop()
 
     def set(self, var: Var, value: float = 1.0) -> Expr:
         return self.replace(var, Const(value))
 
     def setn(self, replacements: dict[Var, float]) -> Expr:
-        return reduce(lambda expr, kv: expr.set(kv[0], kv[1]), replacements.items(), self)
+        return self.subs(replacements, fold=False)
+
+    # Substitutes all vars of the mapping (by name) in a single traversal, values may be numbers or expressions.
+    # Untouched subtrees are shared with the original, with fold constant subtrees are evaluated on the way up
+    # (together with +0, *1, *0 and **1), so fixing all vars of a comparison gives Const(True) or Const(False).
+    def subs(self, mapping: dict[Var | str, float | Expr], fold: bool = True) -> Expr:
+        mapping = {k if isinstance(k, str) else k.name: Expr._lift(v) for k, v in mapping.items()}
+        return self.traverse(Substituter(mapping, fold)) if mapping else self
 
     def solve(self) -> float:
         return self.traverse(CalcTraverser()).result
@@ -102,8 +110,35 @@ class Expr(Tree, ABC):
     def as_equation(self) -> str:
         return self.traverse(ToEquationTraverser()).result
 
-    def vars(self) -> Iterable[Var]:
-        return set(self.traverse(ToVarListTraverser()).result)
+    # Cached after the first call, see Meta
+    def vars(self) -> frozenset[Var]:
+        if (vs := self.__dict__.get('_vars')) is None:
+            vs = self._vars = _vars(self)
+        return vs
+
+    @property
+    def meta(self) -> Meta:
+        if (meta := self.__dict__.get('_meta')) is None:
+            meta = _analyze(self)
+        return meta
+
+    # Drops the cached analysis results which depend on aggregator expansions, i.e. those of the aggregators and
+    # their ancestors (not expanding the aggregators, so ones only created by term functions are not reached). For
+    # aggregators whose where filter or term function reads outside state, e.g. a Param, see Program.bind.
+    def invalidate(self) -> None:
+        _invalidate(_expansion_dependents(self))
+
+    def degree(self) -> float:
+        return self.meta.degree
+
+    def size(self) -> int:
+        return self.meta.size
+
+    def is_linear(self) -> bool:
+        return self.meta.linear
+
+    def params(self) -> Iterable[Param]:
+        return set(self.traverse(ToParamListTraverser()).result)
 
     def expand(self) -> Expr:
         return self.traverse(ExpandTraverser()).result
@@ -115,8 +150,8 @@ class Expr(Tree, ABC):
         # So either it requires .equals in Ops and Terminals (the proper way) or... we just compare their attributes via __dict__ ;-)
         return len(self_inorder := self.inorder()) == len(other_inorder := other.inorder()) \
                and len(self_postorder := self.postorder()) == len(other_postorder := other.postorder()) \
-               and all([tuple[0].__dict__ == tuple[1].__dict__ for tuple in zip(self_inorder, other_inorder)]) \
-               and all([tuple[0].__dict__ == tuple[1].__dict__ for tuple in zip(self_postorder, other_postorder)])
+               and all([_fields(tuple[0]) == _fields(tuple[1]) for tuple in zip(self_inorder, other_inorder)]) \
+               and all([_fields(tuple[0]) == _fields(tuple[1]) for tuple in zip(self_postorder, other_postorder)])
 
     def replace(self, old: Expr, new: Expr) -> Expr:
         return self.traverse(ExprReplacer(old, new))
@@ -131,10 +166,128 @@ class Expr(Tree, ABC):
         return self.traverse(ToEquationTraverser()).result
 
 
+# Set whenever a var or param gets an auto-generated name in the current thread, see Program.st_parallel
+_auto_named = threading.local()
+
+
+# Attributes caching analysis results, they are no part of a node's identity
+_Cached = frozenset(['_meta', '_vars'])
+
+
+def _fields(node: Expr) -> dict:
+    return {k: v for k, v in node.__dict__.items() if k not in _Cached}
+
+
+# Bottom-up analysis of an expression: polynomial degree (inf if not polynomial) and node count (aggregators counted
+# expanded). Nodes are not modified after construction (subs, fix and replace build new nodes and share untouched
+# subtrees), so this is computed once and cached on every node, see Expr.invalidate for aggregators. Var sets
+# are cached the same way, but only on the nodes they were asked for (keeping them at every node of a long sum would
+# take quadratic memory).
+@dataclass(frozen=True, slots=True)
+class Meta:
+    degree: float = 0
+    size: int = 1
+
+    @property
+    def linear(self) -> bool:
+        return self.degree <= 1
+
+
+def _combine(op: Op, left: Meta, right: Meta) -> Meta:
+    match op:
+        case Mul():
+            degree = left.degree + right.degree
+        case Pow() if right.degree == 0:
+            match op.right:
+                case Const(value=k) if float(k).is_integer() and k >= 0:
+                    degree = left.degree * k
+                case _:  # e.g. a Param as exponent, which may be re-bound to anything
+                    degree = 0 if left.degree == 0 else math.inf
+        case Pow():
+            degree = 0 if left.degree == right.degree == 0 else math.inf
+        case _:  # Add, Sub and the comparisons
+            degree = max(left.degree, right.degree)
+    return Meta(degree=degree, size=left.size + right.size + 1)
+
+
+def _analyze(root: Expr) -> Meta:
+    # Iterative post-order (trees can be deeper than the recursion limit), stopping at nodes analyzed before. All
+    # state is local; subtrees shared between threads may be analyzed twice, but both write the same Meta.
+    expansions, todo = {}, [(root, False)]
+    while todo:
+        node, visited = todo.pop()
+        if '_meta' in node.__dict__:
+            continue
+        match node:
+            case Op() if visited:
+                node._meta = _combine(node, node.left._meta, node.right._meta)
+            case Op():
+                todo += [(node, True), (node.right, False), (node.left, False)]
+            case Aggregator() if visited:
+                node._meta = expansions.pop(id(node))._meta
+            case Aggregator():
+                expansions[id(node)] = Expr._lift(node.expr())
+                todo += [(node, True), (expansions[id(node)], False)]
+            case Var():
+                node._meta = Meta(degree=1)
+            case _:  # Const, Param
+                node._meta = Meta(degree=0)
+    return root._meta
+
+
+# The aggregators of an expression (not expanded) and the ops above them
+def _expansion_dependents(root: Expr) -> list[Expr]:
+    dependents, depends, todo = [], set(), [(root, False)]
+    while todo:
+        node, visited = todo.pop()
+        match node:
+            case Op() if visited:
+                if id(node.left) in depends or id(node.right) in depends:
+                    depends.add(id(node))
+                    dependents.append(node)
+            case Op():
+                todo += [(node, True), (node.right, False), (node.left, False)]
+            case Aggregator() if id(node) not in depends:
+                depends.add(id(node))
+                dependents.append(node)
+    return dependents
+
+
+def _invalidate(nodes: list[Expr]) -> None:
+    for node in nodes:
+        for attr in _Cached:
+            node.__dict__.pop(attr, None)
+
+
+def _vars(root: Expr) -> frozenset[Var]:
+    vs, seen, todo = set(), set(), [root]
+    while todo:
+        if id(node := todo.pop()) in seen:
+            continue
+        seen.add(id(node))
+        match node:
+            case _ if (cached := node.__dict__.get('_vars')) is not None:
+                vs |= cached
+            case Op():
+                todo += [node.right, node.left]
+            case Var():
+                vs.add(node)
+            case Aggregator():  # expanded on demand only, so the result is kept
+                node._vars = Expr._lift(node.expr()).vars()
+                vs |= node._vars
+    return frozenset(vs)
+
+
 @dataclass(eq=False)
 class Op(Expr, ABC):
     symb: str | None = None
 
+    # Pickled via the flat wire format (deep trees would exceed the recursion limit otherwise), the leaves are passed
+    # along as objects so that vars and params shared with other pickled objects keep their identity
+    def __reduce__(self) -> tuple:
+        from dsl.wire import dumps, loads
+        return loads, (dumps(self), {v.name: v for v in self.vars()}, {p.name: p for p in self.params()})
+
     @abstractmethod
     def op(self, a: Number, b: Number) -> Number:
         return NotImplementedError()
@@ -222,6 +375,49 @@ class Const(Terminal):
     value: float = 1.0
 
 
+# A Param is a named placeholder for a constant (scalar or NumPy array) whose value can be re-bound after a
+# program (and its backend model) has been built, see Program.bind and Backend.update_params
+@dataclass(eq=False)
+class Param(Terminal):
+    name: str | None = None
+    value: float | Any = 0.0
+    cnt: ClassVar[int] = itertools.count()
+    lock: ClassVar[threading.Lock] = threading.Lock()  # unique names when params are created from several threads
+
+    def __post_init__(self) -> None:
+        if self.name is None:
+            with Param.lock:
+                self.name = 'p' + str(next(Param.cnt))
+            _auto_named.created = True
+
+    def __getitem__(self, idx: int | tuple[int, ...]) -> ParamItem:
+        return ParamItem(name=f'{self.name}[{",".join(map(str, idx)) if isinstance(idx, tuple) else idx}]', param=self, idx=idx)
+
+    def __hash__(self) -> int:
+        return hash(self.name)
+
+    @property
+    def root(self) -> Param:
+        return self
+
+    def get(self) -> float | Any:
+        return self.value
+
+
+# A single entry of an array-shaped Param, always reading the currently bound value of its parent
+@dataclass(eq=False)
+class ParamItem(Param):
+    param: Param | None = None
+    idx: int | tuple[int, ...] = 0
+
+    @property
+    def root(self) -> Param:
+        return self.param
+
+    def get(self) -> float:
+        return float(self.param.value[self.idx])
+
+
 class VarType(Enum):
     CONTINUOUS = "Continuous"
     INT = "Integer"
@@ -236,13 +432,21 @@ class Var(Terminal):
     ub: float = sys.float_info.max
     val: float | None = None
     cnt: ClassVar[int] = itertools.count()
+    lock: ClassVar[threading.Lock] = threading.Lock()  # see Param
 
     def __post_init__(self) -> None:
         if self.name is None:
-            self.name = 'x' + str(next(Var.cnt))
+            with Var.lock:
+                self.name = 'x' + str(next(Var.cnt))
+            _auto_named.created = True
 
+    # A nested dict of vars, one level per rep, or a flat dict keyed by the tuples of a sparse IndexSet (scalars for
+    # 1-tuples), then only vars for existing combinations are created
     @staticmethod
-    def new(prefix: str, *reps: int, type: VarType = VarType.CONTINUOUS, lb: float | None = None, ub: float | None = None) -> dict:
+    def new(prefix: str, *reps: int | IndexSet, type: VarType = VarType.CONTINUOUS, lb: float | None = None, ub: float | None = None) -> dict:
+        if reps and isinstance(reps[0], IndexSet):
+            return {t if len(t) > 1 else t[0]: Var(prefix.format(*t), type, lb, ub) for t in expand(*reps)}
+
         def new_(prefix, nums: list[int], path: list[int] = [], type=type, lb=lb, ub=ub):
             return {num: new_(prefix, nums[1:], path=path + [num]) if nums[1:] else Var(f'{prefix.format(*path, num)}', type, lb, ub) for num in range(nums[0])}
 
@@ -302,6 +506,10 @@ class Traverser(ABC):
     def agg(self, a: Aggregator) -> Self:
         return NotImplementedError
 
+    # Unless a traverser cares about parameters, they are just constants with their currently bound value
+    def param(self, p: Param) -> Self:
+        return self.const(Const(p.get()))
+
 
 @dataclass
 class ToEquationTraverser(Traverser):
@@ -319,6 +527,9 @@ class ToEquationTraverser(Traverser):
     def agg(self, a: Aggregator) -> Self:
         return ToEquationTraverser(a.expr().traverse(ToEquationTraverser()).result)
 
+    def param(self, p: Param) -> Self:
+        return ToEquationTraverser(p.name)
+
 
 @dataclass
 class ToVarListTraverser(Traverser):
@@ -337,6 +548,26 @@ class ToVarListTraverser(Traverser):
         return ToVarListTraverser(self.result + a.expr().traverse(ToVarListTraverser()).result)
 
 
+@dataclass
+class ToParamListTraverser(Traverser):
+    result: list[Param] = field(default_factory=list)
+
+    def const(self, c: Const) -> Self:
+        return self
+
+    def var(self, v: Var) -> Self:
+        return self
+
+    def param(self, p: Param) -> Self:
+        return ToParamListTraverser(self.result + [p.root])
+
+    def op(self, op: Op, left, right) -> Self:
+        return ToParamListTraverser(left.result + right.result)
+
+    def agg(self, a: Aggregator) -> Self:
+        return ToParamListTraverser(self.result + a.expr().traverse(ToParamListTraverser()).result)
+
+
 @dataclass
 class ExpandTraverser(Traverser):
     result: Expr | None = None
@@ -383,6 +614,9 @@ class ExprReplacer(Traverser):
     def var(self, v: Var) -> Self:
         return self.new if v.equals(self.old) else v
 
+    def param(self, p: Param) -> Self:
+        return self.new if p.equals(self.old) else p
+
     def op(self, op: Op, left, right) -> Self:
         return right if left is None else left if right is None else self.new if op.equals(self.old) else op.__class__(left=left, right=right)
 
@@ -390,6 +624,45 @@ class ExprReplacer(Traverser):
         return self.new if a.equals(self.old) else a
 
 
+@dataclass
+class Substituter(Traverser):
+    mapping: dict[str, Expr] = field(default_factory=dict)
+    fold: bool = True
+
+    def const(self, c: Const) -> Self:
+        return c
+
+    def var(self, v: Var) -> Self:
+        return self.mapping.get(v.name, v)
+
+    def param(self, p: Param) -> Self:
+        return p
+
+    def op(self, op: Op, left, right) -> Self:
+        if left is op.left and right is op.right:
+            return op
+        if not self.fold:
+            return op.__class__(left=left, right=right)
+        match op, left, right:
+            case _, Const(), Const():
+                return Const(op.op(left.value, right.value))
+            case Add(), Const(value=0), _:
+                return right
+            case Add() | Sub(), _, Const(value=0):
+                return left
+            case (Mul(), Const(value=0), _) | (Mul(), _, Const(value=0)):
+                return Const(0)
+            case Mul(), Const(value=1), _:
+                return right
+            case Mul() | Pow(), _, Const(value=1):
+                return left
+            case _:
+                return op.__class__(left=left, right=right)
+
+    def agg(self, a: Aggregator) -> Self:
+        return Expr._lift(a.expr()).traverse(self) if any(v.name in self.mapping for v in a.vars()) else a
+
+
 @dataclass
 class Contains(Traverser):
     expr: Expr = None
@@ -401,6 +674,9 @@ class Contains(Traverser):
     def var(self, v: Var) -> Self:
         return v.equals(self.expr)
 
+    def param(self, p: Param) -> Self:
+        return p.equals(self.expr)
+
     def op(self, op: Op, left, right) -> Self:
         return op.equals(self.expr) or left or right
 
@@ -414,10 +690,15 @@ class Aggregator(Terminal, ABC):
     f: Callable = ident
     expr: Callable = ident
 
+    # Aggregators hold lambdas, so they are pickled materialized (see Op.__reduce__)
+    def __reduce__(self) -> tuple:
+        return Op.__reduce__(self)
+
 
 X = TypeVar('X')
 Y = TypeVar('Y')
 
 
-def V(*it: Iterable[X]) -> Callable[[Callable[[Iterable[X]], Y]], Iterable[Y]]:
-    return lambda f: [f(*p) for p in itertools.product(*it)]
+# Ranges may be sparse IndexSets (see dsl.index), where filters the combinations while they are generated
+def V(*it: Iterable[X], where: Callable[..., bool] | None = None) -> Callable[[Callable[[Iterable[X]], Y]], Iterable[Y]]:
+    return lambda f: [f(*p) for p in expand(*it, where=where)]
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import inspect
+import itertools
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Callable
+
+
+def _arity(f: Callable) -> int:
+    return sum(1 for p in inspect.signature(f).parameters.values() if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD))
+
+
+# A sparse set of index tuples, e.g. the edges of a graph or the valid (worker, shift) pairs. Wherever V, Σ, rcon or
+# Var.new accept ranges, an IndexSet contributes all positions of its tuples at once, so only existing combinations
+# are iterated. Single values are stored as 1-tuples.
+@dataclass(frozen=True)
+class IndexSet(Iterable[tuple]):
+    tuples: tuple[tuple, ...] = ()
+    dim: int = field(default=0, compare=False)
+
+    def __init__(self, tuples: Iterable = (), dim: int | None = None) -> None:
+        tuples = tuple(dict.fromkeys(t if isinstance(t, tuple) else (t,) for t in tuples))  # ordered and distinct
+        object.__setattr__(self, 'tuples', tuples)
+        object.__setattr__(self, 'dim', dim if dim is not None else len(tuples[0]) if tuples else 0)
+
+    # The product of ranges (and index sets), the predicate is evaluated as soon as its arguments are bound, so a
+    # where with fewer arguments than positions prunes the product early
+    @staticmethod
+    def product(*it: Iterable, where: Callable[..., bool] | None = None) -> IndexSet:
+        return IndexSet(_product([_tuples(i) for i in it], where, dim := sum(_dim(i) for i in it)), dim=dim)
+
+    def where(self, pred: Callable[..., bool]) -> IndexSet:
+        return IndexSet((t for t in self.tuples if pred(*t)), dim=self.dim)
+
+    # Positions of the tuples in the given order (duplicates are dropped)
+    def project(self, *positions: int) -> IndexSet:
+        return IndexSet((tuple(t[p] for p in positions) for t in self.tuples), dim=len(positions))
+
+    # Hash join: pairs of tuples agreeing on the given positions, the other set's join positions are dropped, e.g.
+    # assignments (worker, shift) joined with shifts (shift, day) on=[(1, 0)] gives (worker, shift, day)
+    def join(self, other: IndexSet, on: Iterable[tuple[int, int]]) -> IndexSet:
+        on = list(on)
+        mine, theirs = [a for a, _ in on], [b for _, b in on]
+        rest = [p for p in range(other.dim) if p not in theirs]
+        index = defaultdict(list)
+        for t in other.tuples:
+            index[tuple(t[p] for p in theirs)].append(tuple(t[p] for p in rest))
+        return IndexSet((t + r for t in self.tuples for r in index.get(tuple(t[p] for p in mine), ())), dim=self.dim + len(rest))
+
+    @cached_property
+    def _set(self) -> frozenset[tuple]:
+        return frozenset(self.tuples)
+
+    @cached_property
+    def _groups(self) -> dict:
+        groups = defaultdict(list)
+        for t in self.tuples:
+            groups[t[0]].append(t[1:])
+        return {k: IndexSet(v, dim=self.dim - 1) for k, v in groups.items()}
+
+    # The completions of a first position, e.g. the neighbours of a node: Σ(edges[i])(lambda j: x[i, j])
+    def __getitem__(self, key: object) -> IndexSet:
+        return self._groups.get(key, IndexSet(dim=self.dim - 1))
+
+    def __contains__(self, t: object) -> bool:
+        return (t if isinstance(t, tuple) else (t,)) in self._set
+
+    def __iter__(self) -> Iterator[tuple]:
+        return iter(self.tuples)
+
+    def __len__(self) -> int:
+        return len(self.tuples)
+
+
+def _tuples(it: Iterable) -> Iterable[tuple]:
+    return it.tuples if isinstance(it, IndexSet) else [(i,) for i in it]
+
+
+def _dim(it: Iterable) -> int:
+    return it.dim if isinstance(it, IndexSet) else 1
+
+
+def _product(its: list[Iterable[tuple]], where: Callable[..., bool] | None, dim: int) -> Iterator[tuple]:
+    if where is None:
+        return (sum(ts, ()) for ts in itertools.product(*its))
+    if (arity := _arity(where) or dim) > dim:
+        raise ValueError(f'The predicate takes {arity} arguments, but there are only {dim} positions')
+
+    def go(k: int, prefix: tuple) -> Iterator[tuple]:
+        if k == len(its):
+            yield prefix
+            return
+        for t in its[k]:
+            # The predicate is checked exactly once, when the position of its last argument gets bound
+            if len(prefix) < arity <= len(prefix) + len(t) and not where(*(prefix + t)[:arity]):
+                continue
+            yield from go(k + 1, prefix + t)
+
+    return go(0, ())
+
+
+# Expands arguments of V: index sets contribute all positions of their tuples, everything else a single one
+def expand(*it: Iterable, where: Callable[..., bool] | None = None) -> Iterable[tuple]:
+    if where is None and not any(isinstance(i, IndexSet) for i in it):
+        return itertools.product(*it)
+    return _product([_tuples(i) for i in it], where, sum(_dim(i) for i in it))
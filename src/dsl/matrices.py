@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import itertools
+import math
+from array import array
+from dataclasses import dataclass
+from enum import IntEnum
+from numbers import Number
+
+import numpy as np
+from scipy import sparse
+
+from dsl.aggregators import Sum
+from dsl.core import Expr, Op, Add, Sub, Mul, Pow, Eq, LE, GE, Const, Param, Var, VarType, Aggregator, V
+from dsl.program import Program
+
+# A polynomial of degree <= 2 is stored as {(): constant, (i,): linear coeff, (i, j): quadratic coeff (i <= j)}
+Poly = dict[tuple[int, ...], float]
+
+_SenseMap = {Eq: '=', LE: '<', GE: '>'}  # same encoding as Gurobi
+
+_TypeMap = {VarType.CONTINUOUS: 'C', VarType.INT: 'I', VarType.BINARY: 'B'}
+
+
+# The numerical content of a program:
+#   min  c0 + c @ x + x @ Q @ x  (Q upper triangular)
+#   s.t. A @ x (sense) rhs,  lb <= x <= ub
+@dataclass
+class Matrices:
+    c: np.ndarray
+    Q: sparse.csr_array
+    c0: float
+    A: sparse.csr_array
+    sense: np.ndarray
+    rhs: np.ndarray
+    lb: np.ndarray
+    ub: np.ndarray
+    types: np.ndarray
+    vars: list[Var]
+    index: dict[str, int]  # var name -> column
+    names: list[str]  # constraint name per row
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.A.shape
+
+    def is_linear(self) -> bool:
+        return self.Q.nnz == 0
+
+    def is_binary(self) -> bool:
+        return bool(np.all(self.types == 'B'))
+
+    def is_continuous(self) -> bool:
+        return bool(np.all(self.types == 'C'))
+
+
+def _scale(a: Poly, s: float) -> Poly:
+    for k in a:
+        a[k] *= s
+    return a
+
+
+# Polynomial arithmetic works in place on the left operand (or the larger one, if commutative) to keep
+# long chains of additions linear instead of quadratic
+def _add(a: Poly, b: Poly) -> Poly:
+    a, b = (a, b) if len(a) >= len(b) else (b, a)
+    for k, v in b.items():
+        a[k] = a.get(k, 0.0) + v
+    return a
+
+
+def _sub(a: Poly, b: Poly) -> Poly:
+    return _add(a, _scale(b, -1.0))
+
+
+def _mul(a: Poly, b: Poly) -> Poly:
+    if len(b) == 1 and () in b:
+        return _scale(a, b[()])
+    if len(a) == 1 and () in a:
+        return _scale(b, a[()])
+    res = {}
+    for ka, va in a.items():
+        for kb, vb in b.items():
+            if len(k := tuple(sorted(ka + kb))) > 2:
+                raise ValueError('Only polynomials up to degree 2 can be exported as matrices')
+            res[k] = res.get(k, 0.0) + va * vb
+    return res
+
+
+def _pow(a: Poly, b: Poly) -> Poly:
+    if b.keys() - {()} or not float(n := b.get((), 0.0)).is_integer() or n < 0:
+        raise ValueError('Only non-negative integer constants are supported as exponents')
+    res = {(): 1.0}
+    for _ in range(int(n)):
+        res = _mul(res, dict(a))
+    return res
+
+
+_OpMap = {Add: _add, Sub: _sub, Mul: _mul, Pow: _pow}
+
+
+class _Kind(IntEnum):
+    OP = 0
+    VAR = 1
+    PARAM = 2
+    CONST = 3
+    SUM = 4
+    AGG = 5
+    NUM = 6
+
+
+_Kinds: dict[type, _Kind] = {}
+
+
+def _kind(cls: type) -> _Kind:
+    # Matching against the (abstract) node classes is comparatively slow, so every class is only looked up once
+    if (k := _Kinds.get(cls)) is None:
+        k = _Kinds[cls] = next(_Kind(k) for k, base in enumerate((Op, Var, Param, Const, Sum, Aggregator, Number)) if issubclass(cls, base))
+    return k
+
+
+def _coefficient(node: Expr) -> float | None:
+    match _kind(type(node)):
+        case _Kind.CONST:
+            return float(node.value)
+        case _Kind.PARAM:
+            return float(node.get())
+        case _:
+            return None
+
+
+def polynomial(expr: Expr, index: dict[str, int], vars: list[Var]) -> Poly:
+    # Iterative post-order walk (no traverser objects, no recursion); unseen vars get the next free column.
+    # Besides nodes, the work stack holds ('op', f) to apply a binary operator and ('sum', n) to add up n terms.
+    todo, results = [expr], []
+    while todo:
+        match node := todo.pop():
+            case ('op', f):
+                right, left = results.pop(), results.pop()
+                results.append(f(left, right))
+            case ('sum', n):
+                acc = {}
+                for _ in range(n):
+                    acc = _add(acc, results.pop())
+                results.append(acc)
+            case _:
+                match _kind(type(node)):
+                    case _Kind.OP:
+                        if (f := _OpMap.get(type(node))) is None:
+                            raise ValueError(f'Operator {node.symb} is not allowed inside an expression')
+                        todo += [('op', f), node.right, node.left]
+                    case _Kind.VAR:
+                        if (col := index.get(node.name)) is None:
+                            col = index[node.name] = len(vars)
+                            vars.append(node)
+                        results.append({(col,): 1.0})
+                    case _Kind.PARAM:
+                        results.append({(): float(node.get())})
+                    case _Kind.CONST:
+                        results.append({(): float(node.value)})
+                    case _Kind.SUM:  # the terms are added up directly instead of building the expression tree of the sum
+                        acc, rest = {}, []
+                        for t in V(*node.lst, where=node.where)(node.f):
+                            match _kind(type(t)):
+                                case _Kind.VAR:
+                                    if (col := index.get(t.name)) is None:
+                                        col = index[t.name] = len(vars)
+                                        vars.append(t)
+                                    acc[(col,)] = acc.get((col,), 0.0) + 1.0
+                                case _Kind.OP if type(t) is Mul and (coef := _coefficient(t.left)) is not None \
+                                        and _kind(type(t.right)) is _Kind.VAR:  # the common coefficient * var term
+                                    if (col := index.get(t.right.name)) is None:
+                                        col = index[t.right.name] = len(vars)
+                                        vars.append(t.right)
+                                    acc[(col,)] = acc.get((col,), 0.0) + coef
+                                case _Kind.CONST:
+                                    acc[()] = acc.get((), 0.0) + t.value
+                                case _Kind.NUM:
+                                    acc[()] = acc.get((), 0.0) + t
+                                case _:
+                                    rest.append(t)
+                        results.append(acc)
+                        todo.append(('sum', len(rest) + 1))
+                        todo += reversed(rest)
+                    case _Kind.AGG:
+                        todo.append(node.expr())
+                    case _Kind.NUM:  # aggregators over plain numbers expand to numbers
+                        results.append({(): float(node)})
+    return results.pop()
+
+
+# Every term is built (by the aggregators' term functions) and visited in Python, so the export scales linearly at
+# roughly 10us per nonzero, about half of it spent building the terms: 10^6 nonzeros take ~10s, 10^7 ~2 minutes.
+def to_matrices(p: Program) -> Matrices:
+    index, vars = {}, []
+    obj = polynomial(p.objective, index, vars)
+
+    rows, cols, vals, sense, rhs = array('q'), array('q'), array('d'), [], array('d')
+    for r, c in enumerate(p.constraints):
+        if type(c.expr) not in _SenseMap:
+            raise ValueError(f'Constraint {c.name} is not of the form lhs (=|<=|>=) rhs')
+        poly = _sub(polynomial(c.expr.left, index, vars), polynomial(c.expr.right, index, vars))
+        rhs.append(0.0 - poly.pop((), 0.0))
+        sense.append(_SenseMap[type(c.expr)])
+        if any(len(k) > 1 for k in poly):
+            raise ValueError(f'Constraint {c.name} is quadratic, only linear constraints can be exported as matrices')
+        rows.extend(itertools.repeat(r, len(poly)))
+        cols.extend(k for k, in poly)
+        vals.extend(poly.values())
+
+    # Vars of the program that do not occur in any expression still get a column (in a deterministic order)
+    for v in sorted([v for v in p.vars if v.name not in index], key=lambda v: v.name):
+        index[v.name] = len(vars)
+        vars.append(v)
+
+    n, m = len(vars), len(p.constraints)
+    c, lin = np.zeros(n), {k[0]: v for k, v in obj.items() if len(k) == 1}
+    c[list(lin)] = list(lin.values())
+    qi, qj, qv = (np.array(a) for a in zip(*quad)) if (quad := [(*k, v) for k, v in obj.items() if len(k) == 2 and v]) else ([], [], [])
+    Q = sparse.csr_array((qv, (qi, qj)), shape=(n, n), dtype=float)
+    A = sparse.csr_array((np.frombuffer(vals, dtype=float), (np.frombuffer(rows, dtype=np.int64), np.frombuffer(cols, dtype=np.int64))), shape=(m, n), dtype=float)
+    A.eliminate_zeros()
+
+    # Binary vars are bounded by [0, 1] regardless of their declared bounds
+    types = np.array([_TypeMap[v.type] for v in vars], dtype='<U1')
+    lb = np.where(types == 'B', 0.0, np.array([-math.inf if v.lb is None else v.lb for v in vars], dtype=float))
+    ub = np.where(types == 'B', 1.0, np.array([math.inf if v.ub is None else v.ub for v in vars], dtype=float))
+
+    return Matrices(c=c, Q=Q, c0=obj.get((), 0.0), A=A, sense=np.array(sense, dtype='<U1'), rhs=np.frombuffer(rhs, dtype=float).copy(),
+                    lb=lb, ub=ub, types=types, vars=vars, index=index, names=[c.name for c in p.constraints])
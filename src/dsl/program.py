@@ -3,14 +3,26 @@ from __future__ import annotations
 import itertools
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
+from enum import Enum
 from functools import reduce
 from typing import Callable, Iterable, ClassVar
 
-from dsl.core import Eq, LE, GE, Expr, Var
-from dsl.core import V
+from dsl.core import Eq, LE, GE, Expr, Var, VarType, Param, Const
+from dsl.core import V, _auto_named, _expansion_dependents, _invalidate
+from dsl.index import expand
 from utils.utils import Copyable
 
 
+class Kind(Enum):
+    LP = 'LP'
+    MILP = 'MILP'
+    QP = 'QP'  # quadratic objective, linear constraints
+    MIQP = 'MIQP'
+    QCQP = 'QCQP'  # quadratic constraints
+    MIQCQP = 'MIQCQP'
+    NLP = 'NLP'  # anything of higher degree or not polynomial
+
+
 @dataclass
 class Constraint(Copyable):
     name: str
@@ -23,19 +35,32 @@ class Program(Copyable, ABC):
     constraints: list[Constraint] = field(default_factory=list)
     max: bool = False
     vars: list[Var] | None = None
+    lazy_families: list[Callable[[Values], Iterable[Constraint]]] = field(default_factory=list)
 
     def __post_init__(self) -> None:
         if not self.vars:
-            self.vars = self.objective.vars()
+            self.vars = set(self.objective.vars())
 
 
     def con(self, name: str, expr: Expr) -> Program:
-        return self.copy(constraints=self.constraints + [c := Constraint(name=name, expr=expr)], vars=self.vars+list(c.expr.vars()))
+        return self._add([Constraint(name=name, expr=expr)])
+
+
+    # Add constraints to the model (via the previous "V/for all"), ranges may be sparse IndexSets filtered by where
+    def rcon(self, *ranges: Iterable[object], where: Callable[..., bool] | None = None) -> Callable[[tuple[object]], tuple[str, Expr]]:
+        return lambda f: self._add([Constraint(name, expr) for name, expr in V(*ranges, where=where)(f)])
+
+    def _add(self, cons: list[Constraint]) -> Program:
+        return self.copy(constraints=self.constraints + cons, vars=set(self.vars).union(*[c.expr.vars() for c in cons]))
 
+    # Add a family of lazy constraints: fn gets a candidate solution and returns the constraints of the family it
+    # violates. Backends only materialize these (via solver callbacks or an outer cutting-plane loop), so families
+    # too large to enumerate, like subtour elimination constraints, stay implicit.
+    def lazy(self, fn: Callable[[Values], Iterable[Constraint]]) -> Program:
+        return self.copy(lazy_families=self.lazy_families + [fn])
 
-    # Add constraints to the model (via the previous "V/for all")
-    def rcon(self, *ranges: Iterable[object]) -> Callable[[tuple[object]], tuple[str, Expr]]:
-        return lambda f: reduce(lambda m, c: m.con(name=c[0], expr=c[1]), V(*ranges)(f), self)
+    def violated(self, values: Values) -> list[Constraint]:
+        return [c for fn in self.lazy_families for c in fn(values)]
 
     @staticmethod
     def impute(cs: object) -> list[tuple[list[list], Callable[[list[object]], tuple[str, Expr]]]]:
@@ -56,9 +81,133 @@ class Program(Copyable, ABC):
         return self.copy(constraints=(cons := [Constraint(name, expr) for r, c in Program.impute(cs) for name, expr in V(*r)(c)]),
                          vars=self.vars.union(itertools.chain.from_iterable([c.expr.vars() for c in cons])))
 
+    # Like st, but the families are built (and their vars and degrees computed) in chunks of chunk_size index tuples
+    # on a thread pool, or with processes=True on a process pool. Chunks are merged in order, so names and order of
+    # the constraints are the same as with st. Processes need picklable families (module-level functions or
+    # functools.partial of them) and send their chunks back in the wire format (see dsl.wire, so sums arrive
+    # expanded); vars (and params) are resolved by name against the given mappings and the vars of the program. Vars
+    # and params created in a worker process must be named, auto-generated names are only unique within a process.
+    def st_parallel(self, *cs, processes: bool = False, workers: int | None = None, chunk_size: int = 10_000,
+                    vars: dict[str, Var] | None = None, params: dict[str, Param] | None = None) -> Program:
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        from dsl.wire import loads
+
+        with (ProcessPoolExecutor if processes else ThreadPoolExecutor)(workers) as pool:
+            parts = [[(str(i), c)] if isinstance(c, Expr) else
+                     pool.submit(_build_wire if processes else _build, c[1], chunk)
+                     for i, c in enumerate(cs) for chunk in _chunks(c, chunk_size)]
+            parts = [part if isinstance(part, list) else part.result() for part in parts]
+
+        if processes:
+            vars, params = {v.name: v for v in self.vars} | (vars or {}), dict(params or {})
+            parts = [[(c.name, c.expr) for c in loads(part, vars, params).constraints] if isinstance(part, bytes) else part
+                     for part in parts]
+        cons = [Constraint(name, expr) for part in parts for name, expr in part]
+        return self.copy(constraints=cons, vars=self.vars.union(itertools.chain.from_iterable([c.expr.vars() for c in cons])))
+
+    # Degrees are cached on the expressions (see dsl.core.Meta), so these are cheap enough to decide on a backend
+    def degree(self) -> float:
+        return max([self.objective.degree()] + [c.expr.degree() for c in self.constraints])
+
+    def is_binary(self) -> bool:
+        return all(v.type == VarType.BINARY for v in self.vars)
+
+    @property
+    def kind(self) -> Kind:
+        integral = any(v.type != VarType.CONTINUOUS for v in self.vars)
+        match self.objective.degree(), max([c.expr.degree() for c in self.constraints], default=0):
+            case obj, con if max(obj, con) <= 1:
+                return Kind.MILP if integral else Kind.LP
+            case obj, con if con <= 1 and obj <= 2:
+                return Kind.MIQP if integral else Kind.QP
+            case obj, con if max(obj, con) <= 2:
+                return Kind.MIQCQP if integral else Kind.QCQP
+            case _:
+                return Kind.NLP
+
+    # Whether the program can be compiled into a QUBO (see dsl.qubo): binary vars, quadratic objective, linear constraints
+    def is_bqm(self) -> bool:
+        return self.is_binary() and self.kind in (Kind.MILP, Kind.MIQP)
+
+    def params(self) -> dict[str, Param]:
+        return dict(self._params())
+
+    # The params are collected by one traversal of all expressions on first use, together with the nodes whose
+    # cached analysis depends on aggregator expansions (see Expr.invalidate). Programs are not changed in place (con,
+    # st, fix, ... return copies, which start without the registry), so repeated binds only substitute values.
+    def _params(self) -> dict[str, Param]:
+        if (known := self.__dict__.get('_registry')) is None:
+            exprs = [self.objective] + [c.expr for c in self.constraints]
+            self._dependents = [node for e in exprs for node in _expansion_dependents(e)]
+            known = self._registry = {p.name: p for e in exprs for p in e.params()}
+        return known
+
+    # Re-bind parameter values in place (the Param objects are shared with any backend built from this program).
+    # Params are known by name if they occur in an expression; ones only read by where filters or term functions of
+    # aggregators have to be bound by the Param object once, after that their name works, too. Each bind drops the cached analysis of the program's aggregators and the ops above them (their where filters and
+    # term functions may read params), so the next degree()/vars() re-expands them; programs without aggregators keep
+    # all caches.
+    def bind(self, params: dict[str | Param, object]) -> Program:
+        known = self._params()
+        for key, value in params.items():
+            match key:
+                case Param():
+                    name = key.name
+                    known.setdefault(name, key)
+                case _:  # str
+                    name = key
+            if name not in known:
+                raise KeyError(f'Unknown parameter \'{name}\'')
+            if getattr(known[name].value, 'shape', ()) != getattr(value, 'shape', ()):
+                raise ValueError(f'Parameter \'{name}\' expects shape {getattr(known[name].value, "shape", ())}, got {getattr(value, "shape", ())}')
+            known[name].value = value
+        _invalidate(self._dependents)
+        return self
+
+    # Fixes vars to values (or expressions) in the objective and all constraints, see Expr.subs. Constraints which
+    # fold to True are dropped, ones folding to False make the program infeasible.
+    def fix(self, mapping: dict[Var | str, float | Expr]) -> Program:
+        names = {k if isinstance(k, str) else k.name for k in mapping}
+        constraints = []
+        for c in self.constraints:
+            match expr := c.expr.subs(mapping):
+                case Const() if expr.value:
+                    continue
+                case Const():
+                    raise ValueError(f'Constraint \'{c.name}\' is violated by the fixed values')
+                case _:
+                    constraints.append(Constraint(c.name, expr))
+        objective = Expr._lift(self.objective.subs(mapping))
+        vars = {v for v in self.vars if v.name not in names}.union(objective.vars(), *[c.expr.vars() for c in constraints])
+        return self.copy(objective=objective, constraints=constraints, vars=vars)
+
     def expand(self) -> Program:
         return self.copy(objective=self.objective.expand(), constraints=[Constraint(c.name, c.expr.expand()) for c in self.constraints])
 
+    def to_matrices(self) -> Matrices:
+        from dsl.matrices import to_matrices  # NumPy/SciPy are only needed for the export
+        return to_matrices(self)
+
+    def to_qubo(self, lagrange: float | None = None) -> Qubo:
+        from dsl.qubo import to_qubo
+        return to_qubo(self, lagrange)
+
+    # Compact binary serialization, see dsl.wire; vars (and params) are resolved by name against the given mappings
+    def dumps(self, solution: bool = True) -> bytes:
+        from dsl.wire import dumps
+        return dumps(self, solution)
+
+    @staticmethod
+    def loads(data: bytes, vars: dict[str, Var] | None = None, params: dict[str, Param] | None = None) -> Program:
+        from dsl.wire import loads
+        return loads(data, vars, params)
+
+    # Lazy families are not part of the wire format, they are pickled by themselves (so they have to be picklable,
+    # e.g. module-level functions, or pickling fails instead of silently relaxing the program)
+    def __reduce__(self) -> tuple:
+        from dsl.wire import dumps
+        return _unpickle, (dumps(self.copy(lazy_families=[])), {v.name: v for v in self.vars}, self.params(), self.lazy_families)
+
     def export(self) -> None:
         self._backend.model_as_str()
 
@@ -76,3 +225,31 @@ class Max(Program):
             self.objective = -self.objective
             self.max = True
 
+
+
+def _chunks(c: Expr | tuple, size: int) -> Iterable[list[tuple]]:
+    if isinstance(c, Expr):
+        return [[]]
+    tuples = list(expand(*c[0]))
+    return [tuples[i:i + size] for i in range(0, len(tuples), size)]
+
+
+def _unpickle(data: bytes, vars: dict[str, Var], params: dict[str, Param], lazy_families: list) -> Program:
+    return Program.loads(data, vars, params).copy(lazy_families=lazy_families)
+
+
+# Workers of Program.st_parallel, module-level to be picklable
+def _build(f: Callable[..., tuple[str, Expr]], chunk: list[tuple]) -> list[tuple[str, Expr]]:
+    cons = [f(*t) for t in chunk]
+    for _, expr in cons:
+        expr.vars(), expr.meta
+    return cons
+
+
+def _build_wire(f: Callable[..., tuple[str, Expr]], chunk: list[tuple]) -> bytes:
+    from dsl.wire import dumps
+    _auto_named.created = False
+    cons = [Constraint(name, expr) for name, expr in map(lambda t: f(*t), chunk)]
+    if _auto_named.created:
+        raise ValueError('Families built in processes must name the vars and params they create')
+    return dumps(Min(Const(0), constraints=cons))
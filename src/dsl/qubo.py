@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from collections.abc import Mapping
+
+import numpy as np
+from scipy import sparse
+
+from dsl.core import Var
+from dsl.matrices import Matrices
+from dsl.program import Program
+
+
+# An unconstrained binary program: min x @ Q @ x + offset, Q upper triangular with the linear terms on its
+# diagonal (x_i * x_i = x_i). The first len(vars) columns are the program's vars, the remaining ones slack bits.
+@dataclass
+class Qubo:
+    Q: sparse.csr_array
+    offset: float
+    labels: list[str]
+    vars: list[Var]
+
+    @property
+    def linear(self) -> np.ndarray:
+        return self.Q.diagonal()
+
+    @property
+    def quadratic(self) -> sparse.coo_array:
+        return sparse.triu(self.Q, k=1, format='coo')
+
+    def energy(self, x: np.ndarray) -> np.ndarray | float:
+        return np.einsum('...i,...i->...', x @ self.Q, x) + self.offset
+
+    # Same job as dimod's cqm_to_bqm inverter: map a sample (array or label-keyed mapping) back to the program's vars
+    def invert(self, sample: np.ndarray | Mapping[str, float]) -> dict[str, float]:
+        match sample:
+            case Mapping():
+                return {v.name: sample[v.name] for v in self.vars}
+            case _:  # array aligned to labels
+                return dict(zip([v.name for v in self.vars], np.asarray(sample)[:len(self.vars)].tolist()))
+
+
+def _slack(m: Matrices) -> tuple[sparse.csr_array, np.ndarray, sparse.csr_array, np.ndarray, list[str]]:
+    # Normalize inequalities to a @ x <= b and turn them into a @ x + s = b with a log-encoded slack
+    # s = sum_k w_k s_k in [0, b - min(a @ x)], w = 1, 2, 4, ..., (rest). Redundant rows (b >= max(a @ x)) are dropped.
+    # Slack weights are integral, so inequalities must have integral coefficients and right-hand sides.
+    sense, sign = m.sense, np.where(m.sense == '>', -1.0, 1.0)
+    A, rhs = (sparse.diags_array(sign) @ m.A).tocsr(), m.rhs * sign
+    lo, hi = (A.minimum(0)).sum(axis=1), (A.maximum(0)).sum(axis=1)
+    keep = (sense == '=') | (rhs < hi)
+    fractional = (rhs != np.round(rhs)) | (np.abs(A - A.rint()).sum(axis=1) > 0)
+    if (bad := np.flatnonzero(keep & (sense != '=') & fractional)).size:
+        raise ValueError(f'Inequalities with non-integral coefficients or right-hand sides cannot be encoded with binary slack: '
+                         f'{", ".join(m.names[r] for r in bad[:5])}{", ..." if bad.size > 5 else ""}')
+    span = np.where(sense[keep] == '=', 0, np.floor(rhs[keep] - lo[keep])).clip(min=0).astype(np.int64)
+    bits = np.where(span > 0, np.floor(np.log2(np.maximum(span, 1))).astype(np.int64) + 1, 0)
+
+    row = np.repeat(np.arange(span.size), bits)
+    k = np.arange(bits.sum()) - np.repeat(np.cumsum(bits) - bits, bits)
+    last = k == np.repeat(bits - 1, bits)
+    weight = np.where(last, np.repeat(span, bits) - (2.0 ** k - 1), 2.0 ** k)
+    S = sparse.csr_array((weight, (row, np.arange(row.size))), shape=(span.size, row.size))
+    rows = np.flatnonzero(keep)
+    return A[keep], rhs[keep], S, rows, [f'slack_{m.names[r]}_{i}' for r, i in zip(rows[row].tolist(), k.tolist())]
+
+
+def to_qubo(p: Program | Matrices, lagrange: float | np.ndarray | None = None) -> Qubo:
+    m = p if isinstance(p, Matrices) else p.to_matrices()
+    if not m.is_binary():
+        raise ValueError('Only programs over binary vars can be compiled to a QUBO')
+
+    # Penalty strength per constraint, by default 10x the largest objective bias (as in dimod.cqm_to_bqm)
+    if lagrange is None:
+        lagrange = 10.0 * max(np.abs(m.c).max(initial=0.0), np.abs(m.Q.data).max(initial=0.0)) or 1.0
+    lagrange = np.broadcast_to(np.asarray(lagrange, dtype=float), m.rhs.shape)
+
+    A, b, S, rows, slack = _slack(m)
+    s = S.shape[1]
+    E = sparse.hstack([A, S], format='csr')
+
+    # sum_r lagrange_r * (E_r @ x - b_r)^2 = x @ (E.T @ L @ E) @ x - 2 (E.T @ L @ b) @ x + b @ L @ b
+    L = sparse.diags_array(lagrange[rows])
+    P = (E.T @ L @ E).tocsr()
+    obj = sparse.block_diag([m.Q, sparse.csr_array((s, s))], format='csr')
+    linear = np.concatenate([m.c, np.zeros(s)]) - 2 * (E.T @ (lagrange[rows] * b))
+
+    # Fold everything into one upper triangular matrix: off-diagonal entries of the symmetric P count twice
+    Q = (sparse.triu(obj, k=1) + 2 * sparse.triu(P, k=1) + sparse.diags_array(linear + obj.diagonal() + P.diagonal())).tocsr()
+    Q.eliminate_zeros()
+    return Qubo(Q=Q, offset=m.c0 + float(b @ (lagrange[rows] * b)),
+                labels=[v.name for v in m.vars] + slack, vars=m.vars)
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import struct
+from collections.abc import MutableMapping
+from importlib import import_module
+
+import numpy as np
+
+from dsl.arena import Arena
+from dsl.core import Expr, Var, IntVar, BinVar, VarType, Param
+from dsl.program import Program, Constraint
+
+# Wire format of Programs and Exprs: a header followed by flat little-endian arrays, each prefixed by its dtype and
+# length. Expressions are stored as an Arena (see dsl.arena) with aggregators materialized, leaves refer to the var,
+# param and constant tables. Strings are stored as one NUL separated UTF-8 blob.
+#
+#   header   magic b'HMNW', version (u8), kind (u8: 0 Expr, 1 Program)
+#   arena    op (i1), left (i4), right (i4), values (f8)
+#   vars     names, type (i1), lb (f8), ub (f8), val (f8), NaN for None (unbounded or no value)
+#   params   root param names, per root param its shape (i8) and value (f8), then per param of the arena its root (i4)
+#            and flat index into the root's value (i8, -1 for the root itself)
+#   roots    node per expression: the objective followed by the constraints
+#   program  class ('module:qualname') and constraint names, max (u1), vars as set (u1), number of program vars (i8)
+MAGIC = b'HMNW'
+VERSION = 1
+
+_Header = struct.Struct('<4sBB')
+_Array = struct.Struct('<2sQ')  # dtype code, length
+_VarTypes = list(VarType)
+_VarClassMap = {VarType.BINARY: BinVar, VarType.INT: IntVar}
+
+
+def _pack(buf: list[bytes], a: np.ndarray | list, dtype: str) -> None:
+    a = np.ascontiguousarray(a, dtype=dtype)
+    buf += [_Array.pack(dtype.encode(), a.size), a.tobytes()]
+
+
+def _pack_str(buf: list[bytes], strings: list[str]) -> None:
+    _pack(buf, np.frombuffer('\0'.join(strings).encode(), dtype=np.uint8), 'u1')
+    _pack(buf, [len(strings)], 'i8')
+
+
+def _item(p: Param, idx: int) -> Param:
+    if idx < 0:
+        return p
+    idx = tuple(int(i) for i in np.unravel_index(idx, np.shape(p.value)))
+    return p[idx if len(idx) > 1 else idx[0]]
+
+
+class _Reader:
+    def __init__(self, data: bytes | memoryview) -> None:
+        self.data, self.pos = memoryview(data), 0
+
+    def array(self) -> np.ndarray:
+        dtype, n = _Array.unpack_from(self.data, self.pos)
+        self.pos += _Array.size
+        a = np.frombuffer(self.data, dtype=dtype.decode(), count=n, offset=self.pos)
+        self.pos += a.nbytes
+        return a
+
+    def strings(self) -> list[str]:
+        blob, n = self.array().tobytes().decode(), int(self.array()[0])
+        return blob.split('\0') if n else []
+
+
+def _dumps(exprs: list[Expr], vars: list[Var], kind: int, tail: list[bytes] | None = None, solution: bool = True) -> bytes:
+    arena = Arena()
+    for v in vars:  # program vars first, so that their order is kept even if some do not occur in any expression
+        arena.var(v)
+    roots = [arena.from_expr(e).id for e in exprs]
+    n = arena.size
+
+    buf = [_Header.pack(MAGIC, VERSION, kind)]
+    _pack(buf, arena.op[:n], 'i1')
+    _pack(buf, arena.left[:n], 'i4')
+    _pack(buf, arena.right[:n], 'i4')
+    _pack(buf, arena.values, 'f8')
+
+    _pack_str(buf, [v.name for v in arena.vars])
+    _pack(buf, [_VarTypes.index(v.type) for v in arena.vars], 'i1')
+    _pack(buf, [v.lb for v in arena.vars], 'f8')
+    _pack(buf, [v.ub for v in arena.vars], 'f8')
+    _pack(buf, [np.nan if v.val is None or not solution else v.val for v in arena.vars], 'f8')
+
+    # Array params are referenced by their items, so their values are stored once with the root param
+    root_params = list({p.root.name: p.root for p in arena.params}.values())
+    index = {p.name: i for i, p in enumerate(root_params)}
+    _pack_str(buf, [p.name for p in root_params])
+    for p in root_params:
+        _pack(buf, np.shape(p.value), 'i8')
+        _pack(buf, np.ravel(p.value), 'f8')
+    _pack(buf, [index[p.root.name] for p in arena.params], 'i4')
+    _pack(buf, [-1 if p.root is p else np.ravel_multi_index(np.atleast_1d(p.idx), np.shape(p.root.value)) for p in arena.params], 'i8')
+
+    _pack(buf, roots, 'i4')
+    return b''.join(buf + (tail or []))
+
+
+# Lazy constraint families (Program.lazy) are plain functions and therefore not part of the format, programs with
+# them are rejected instead of silently relaxed (pickling keeps them, see Program.__reduce__). Without solution,
+# the current values of the vars (Var.val) are left out, e.g. to hash a program's content (see backends.cache).
+def dumps(obj: Program | Expr, solution: bool = True) -> bytes:
+    match obj:
+        case Program() if obj.lazy_families:
+            raise ValueError('Programs with lazy constraint families cannot be serialized into the wire format')
+        case Program():
+            tail = []
+            _pack_str(tail, [f'{type(obj).__module__}:{type(obj).__qualname__}'] + [c.name for c in obj.constraints])
+            _pack(tail, [obj.max, isinstance(obj.vars, set)], 'u1')
+            _pack(tail, [len(obj.vars or [])], 'i8')
+            return _dumps([obj.objective] + [c.expr for c in obj.constraints], list(obj.vars or []), 1, tail, solution)
+        case _:  # Expr
+            return _dumps([obj], [], 0, solution=solution)
+
+
+# vars and params map names to already existing objects which are used instead of new ones (this is how variable
+# identity survives a round trip); new objects are added to them
+def loads(data: bytes | memoryview, vars: MutableMapping[str, Var] | None = None,
+          params: MutableMapping[str, Param] | None = None) -> Program | Expr:
+    vars, params = {} if vars is None else vars, {} if params is None else params
+    r = _Reader(data)
+    magic, version, kind = _Header.unpack_from(r.data)
+    if magic != MAGIC:
+        raise ValueError('Not a serialized program or expression')
+    if version != VERSION:
+        raise ValueError(f'Unsupported wire format version {version}, expected {VERSION}')
+    r.pos = _Header.size
+
+    op, left, right, values = r.array(), r.array(), r.array(), r.array()
+    arena = Arena(capacity=max(op.size, 1))
+    arena.op[:op.size], arena.left[:op.size], arena.right[:op.size], arena.size, arena.values = op, left, right, op.size, values.copy()
+
+    names, types, lbs, ubs, vals = r.strings(), r.array(), r.array(), r.array(), r.array()
+    for name, t, lb, ub, val in zip(names, types.tolist(), lbs.tolist(), ubs.tolist(), vals.tolist()):
+        if name not in vars:
+            t = _VarTypes[t]
+            lb, ub, val = (None if np.isnan(a) else a for a in (lb, ub, val))
+            vars[name] = _VarClassMap.get(t, Var)(name=name, type=t, lb=lb, ub=ub, val=val)
+        arena.vars.append(vars[name])
+
+    root_params = []
+    for name in r.strings():
+        shape, value = tuple(r.array().tolist()), r.array()
+        if name not in params:
+            params[name] = Param(name=name, value=value.reshape(shape).copy() if shape else float(value[0]))
+        root_params.append(params[name])
+    for root, idx in zip(r.array().tolist(), r.array().tolist()):
+        arena.params.append(_item(root_params[root], idx))
+
+    exprs = arena.to_exprs(r.array().tolist())
+    if kind == 0:
+        return exprs[0]
+
+    (cls, *cons), (max_, as_set), (n,) = r.strings(), r.array().tolist(), r.array().tolist()
+    module, _, qualname = cls.partition(':')
+    # Only Program classes are called, a crafted or stale payload must not name an arbitrary callable
+    if not (isinstance(cls := getattr(import_module(module), qualname, None), type) and issubclass(cls, Program)):
+        raise ValueError(f'{module}:{qualname} is not a Program class')
+    program_vars = arena.vars[:n]
+    return cls(objective=exprs[0], constraints=[Constraint(name, e) for name, e in zip(cons, exprs[1:])], max=bool(max_),
+               vars=set(program_vars) if as_set else program_vars)
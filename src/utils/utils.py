@@ -22,11 +22,13 @@ class Copyable(ABC):
 T = TypeVar('T')
 
 
+# + and += behave like they do for lists: + returns a new Deque, += extends in place. Unlike for lists, a single
+# (non-iterable) item may be added, too.
 class Deque(deque, Generic[T]):
     def __init__(self, it: Iterable[T] = []):
         super().__init__(it)
 
-    def __add__(self, item: T) -> Deque[T]:
+    def __iadd__(self, item: T) -> Deque[T]:
         match item:
             case Iterable():
                 self.extend(item)
@@ -34,12 +36,16 @@ class Deque(deque, Generic[T]):
                 self.append(item)
         return self
 
+    def __add__(self, item: T) -> Deque[T]:
+        res = Deque(self)
+        res += item
+        return res
+
     def __radd__(self, item: T) -> Deque[T]:
+        res = Deque(self)
         match item:
             case Iterable():
-                self.extendleft(reversed(item))
+                res.extendleft(reversed(item))
             case _:
-                self.appendleft(item)
-        return self
-
-
+                res.appendleft(item)
+        return res
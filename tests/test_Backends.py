@@ -0,0 +1,395 @@
+import numpy as np
+import pytest
+
+from backends.model import Status
+from dsl.aggregators import Σ
+from dsl.core import Var, BinVar, IntVar, Param
+from dsl.program import Min, Max
+
+
+def test_gurobi_update_params():
+    gurobipy = pytest.importorskip('gurobipy')
+    from backends.gurobi import GurobiBackend
+    gurobipy.setParam('OutputFlag', 0)
+    d = Param('d', np.array([2.0, 3.0]))
+    x = Var.new('gx{}', 2, lb=0, ub=10)
+    p = Min(Σ(range(2))(lambda i: x[i])).st(*[x[i] >= d[i] for i in range(2)])
+    backend = GurobiBackend(p)
+    assert backend.solve().values == {'gx0': 2.0, 'gx1': 3.0}
+    model = backend.p_
+    backend.update_params({'d': np.array([4.0, 1.0])})
+    assert backend.p_ is model  # patched, not rebuilt
+    assert backend.solve().values == {'gx0': 4.0, 'gx1': 1.0}
+
+
+def test_dimod_update_params():
+    pytest.importorskip('dimod')
+    from backends.dwave import ExactBQMBackend
+    y = BinVar.new('dy{}', 3)
+    k = Param('k', 1.0)
+    backend = ExactBQMBackend(Min(Σ(range(3))(lambda i: y[i])).st(Σ(range(3))(lambda i: y[i]) >= k))
+    assert sum(backend.solve().values.values()) == 1
+    assert sum(backend.update_params({k: 2.0}).solve().values.values()) == 2
+
+
+def test_highs_milp():
+    from backends.highs import ScipyMilpBackend
+    x, y = Var('hx', lb=0, ub=10), IntVar('hy', lb=0, ub=10)
+    result = ScipyMilpBackend(Max(x + 2 * y).st(x + y <= 5.5, x - y >= -2)).solve()
+    assert result.status == Status.OPTIMAL
+    assert result.values == pytest.approx({'hx': 2.5, 'hy': 3.0})
+
+
+def test_highs_lp():
+    from backends.highs import ScipyMilpBackend
+    x, y = Var('lx', lb=0, ub=10), Var('ly', lb=0, ub=10)
+    result = ScipyMilpBackend(Min(x + y).st(x + 2 * y >= 4, x == 3 * y)).solve(mutate_vars=True)
+    assert result.status == Status.OPTIMAL
+    assert (x.val, y.val) == (pytest.approx(2.4), pytest.approx(0.8))
+
+
+def test_highs_infeasible():
+    from backends.highs import ScipyMilpBackend
+    x = IntVar('ix', lb=0, ub=10)
+    result = ScipyMilpBackend(Min(x).st(x >= 11)).solve()
+    assert result.status == Status.INFEASIBLE and result.values is None
+
+
+def test_dimod_qubo():
+    pytest.importorskip('dimod')
+    from backends.dwave import ExactBQMBackend
+    y = BinVar.new('qb{}', 3)
+    backend = ExactBQMBackend(Max(Σ(range(3))(lambda i: (i + 1) * y[i])).st(Σ(range(3))(lambda i: y[i]) <= 2))
+    assert backend.cqm is None  # compiled directly, no CQM involved
+    assert backend.solve().values == {'qb0': 0, 'qb1': 1, 'qb2': 1}
+
+
+def test_anneal():
+    from backends.anneal import AnnealBackend
+    y = BinVar.new('an{}', 4)
+    p = Max(Σ(range(4))(lambda i: (i + 1) * y[i])).st(Σ(range(4))(lambda i: y[i]) <= 2)
+    backend = AnnealBackend(p, num_reads=64, num_sweeps=100, seed=0)
+    samples, energies = backend.sample()
+    assert samples.shape == (64, len(backend.p_.labels))
+    assert energies == pytest.approx(backend.p_.energy(samples.astype(float)))
+    assert backend.solve().values == {'an0': 0, 'an1': 0, 'an2': 1, 'an3': 1}
+
+
+def test_anneal_workers():
+    from backends.anneal import AnnealBackend
+    y = BinVar.new('aw{}', 3)
+    backend = AnnealBackend(Min(y[0] + y[1] - y[2]), num_reads=4, num_sweeps=20, seed=0, workers=2)
+    assert backend.sample()[0].shape == (4, 3)
+
+
+def test_result_views():
+    from backends.nop import NOP
+    x, y = Var('rx'), Var('ry')
+    result = NOP(Min(x + y)).solve(mutate_vars=True)
+    assert isinstance(result.x, np.ndarray) and result.x.shape == (2,)
+    assert result.values == {'rx': 0.0, 'ry': 0.0}
+    assert result.values[x] == result.values['rx'] == 0.0
+    assert result.by_var[y] == 0.0
+    assert x.val == 0.0 and y.val == 0.0
+
+
+def test_dimod_sampleset():
+    pytest.importorskip('dimod')
+    from backends.dwave import ExactCQMBackend
+    y = BinVar.new('sy{}', 3)
+    result = ExactCQMBackend(Min(-Σ(range(3))(lambda i: y[i])).st(Σ(range(3))(lambda i: y[i]) <= 1)).solve()
+    assert result.samples.shape == (8, 3) and result.energies.shape == (8,)
+    assert result.feasible.sum() == 4
+    assert sum(result.values.values()) == 1  # best feasible sample, not just the lowest energy
+
+
+def test_registry():
+    from backends.registry import get_backend, register, available
+    from backends.highs import ScipyMilpBackend
+    from backends.nop import NOP
+    assert get_backend('highs') is ScipyMilpBackend
+    register('noop', 'backends.nop:NOP')
+    assert 'noop' in available() and get_backend('noop') is NOP
+    with pytest.raises(KeyError):
+        get_backend('unknown')
+
+
+def test_lazy_imports():
+    import os, subprocess, sys
+    code = 'import sys, backends.dwave, backends.registry; print(any(m in sys.modules for m in ("dimod", "dwave.system", "gurobipy")))'
+    assert subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                          env={**os.environ, 'PYTHONPATH': os.pathsep.join(sys.path)}).stdout.strip() == 'False'
+
+
+def test_gurobi_iter_solutions():
+    gurobipy = pytest.importorskip('gurobipy')
+    from backends.gurobi import GurobiBackend
+    gurobipy.setParam('OutputFlag', 0)
+    w, v = [3, 4, 5, 6], [4, 5, 6, 8]
+    x = BinVar.new('ix{}', 4)
+    p = Max(Σ(range(4))(lambda i: v[i] * x[i])).st(Σ(range(4))(lambda i: w[i] * x[i]) <= 10)
+    *incumbents, final = GurobiBackend(p).iter_solutions()
+    assert all(r.status == Status.SUBOPTIMAL for r in incumbents) and final.status == Status.OPTIMAL
+    assert sum(v[i] * final.values[x[i]] for i in range(4)) == 13
+    solutions = GurobiBackend(p).iter_solutions()
+    assert next(solutions).x is not None
+    solutions.close()  # stops the solver
+
+
+def test_anneal_iter_solutions():
+    from backends.anneal import AnnealBackend
+    x = BinVar.new('ax{}', 3)
+    p = Min(Σ(range(3))(lambda i: x[i])).st(Σ(range(3))(lambda i: x[i]) == 1)
+    results = list(AnnealBackend(p, num_reads=10, seed=1).iter_solutions(chunk_size=4))
+    assert [len(r.samples) for r in results] == [4, 4, 2]  # batches of chunk_size, the last one holds the rest
+    assert min(r.energies.min() for r in results) == 1
+
+
+def test_dimod_iter_solutions():
+    pytest.importorskip('dimod')
+    from backends.dwave import SimulatedAnnealingBQMBackend
+    x = BinVar.new('sx{}', 3)
+    solutions = SimulatedAnnealingBQMBackend(Min(Σ(range(3))(lambda i: x[i]))).iter_solutions(num_reads=4, chunk_size=2)
+    assert len(next(solutions).samples) == 2 and len(next(solutions).samples) == 2
+    assert next(solutions, None) is None
+
+
+def _tsp(n: int):
+    from dsl.program import Constraint
+    rng = np.random.default_rng(1)
+    pts = rng.random((n, 2))
+    dist = np.linalg.norm(pts[:, None] - pts[None], axis=2)
+    edges = [(i, j) for i in range(n) for j in range(i + 1, n)]
+    x = {e: BinVar(f'tsp{e[0]}_{e[1]}', lb=0, ub=1) for e in edges}
+
+    def subtours(values):
+        # One subtour elimination constraint per connected component which is not the whole tour
+        adj, seen, cuts = {i: [j for e in edges if values[x[e]] > 0.5 and i in e for j in e if j != i] for i in range(n)}, set(), []
+        for s in range(n):
+            todo, comp = [s], set()
+            while todo:
+                if (u := todo.pop()) not in comp | seen:
+                    comp.add(u)
+                    todo += adj[u]
+            seen |= comp
+            if comp and len(comp) < n:
+                inner = [e for e in edges if e[0] in comp and e[1] in comp]
+                cuts.append(Constraint(f'sub{sorted(comp)}', Σ(inner)(lambda e: x[e]) <= len(comp) - 1))
+        return cuts
+
+    p = Min(Σ(edges)(lambda e: float(dist[e]) * x[e])) \
+        .st(([range(n)], lambda i: (f'deg{i}', Σ([e for e in edges if i in e])(lambda e: x[e]) == 2))).lazy(subtours)
+    return p, subtours, lambda result: sum(dist[e] * result.values[x[e]] for e in edges)
+
+
+def test_gurobi_lazy():
+    gurobipy = pytest.importorskip('gurobipy')
+    from backends.gurobi import GurobiBackend
+    gurobipy.setParam('OutputFlag', 0)
+    p, subtours, length = _tsp(7)
+    backend = GurobiBackend(p)
+    result = backend.solve()
+    assert result.status == Status.OPTIMAL and not subtours(result.values)
+    assert len(backend.p.constraints) == 7  # added via cbLazy only
+    assert length(result) == pytest.approx(2.5390, abs=1e-4)  # brute force optimum
+
+
+def test_cutting_planes():
+    from backends.highs import ScipyMilpBackend
+    p, subtours, length = _tsp(7)
+    backend = ScipyMilpBackend(p)
+    result = backend.solve()
+    assert result.status == Status.OPTIMAL and not subtours(result.values)
+    assert len(backend.p.constraints) > 7 and len(p.constraints) == 7
+    assert length(result) == pytest.approx(2.5390, abs=1e-4)  # brute force optimum
+
+
+def test_route(monkeypatch):
+    from backends import registry
+    from backends.highs import ScipyMilpBackend
+    from backends.anneal import AnnealBackend
+    x, b = Var('rx', lb=0, ub=1), BinVar.new('rb{}', 2)
+    assert registry.route(Min(x).st(x >= 0)) is ScipyMilpBackend
+    bqm = Min(b[0] * b[1]).st(b[0] + b[1] >= 1)
+    if registry.find_spec('gurobipy') is not None:  # the exact solver is preferred when installed
+        assert registry.route(bqm).__name__ == 'GurobiBackend'
+    monkeypatch.setattr(registry, 'find_spec', lambda name: None)
+    assert registry.route(bqm) is AnnealBackend
+
+
+def test_gurobi_env_pool():
+    pytest.importorskip('gurobipy')
+    import queue
+    from backends.gurobi import GurobiBackend, EnvPool
+    d = Param('pd', 2.0)
+    x = Var('px', lb=0, ub=10)
+    p = Min(x).st(x >= d)
+    with EnvPool({'single': {'OutputFlag': 0, 'Threads': 1}}) as pool:
+        with GurobiBackend(p, pool=pool, profile='single', reset=True) as backend:
+            env, model = backend._env, backend.p_
+            assert model.Params.Threads == 1 and backend.solve().values == {'px': 2.0}
+            assert backend.update_params({d: 3.0}).solve().values == {'px': 3.0} and backend.p_ is model
+            with pytest.raises(queue.Empty):
+                pool.checkout('single', timeout=0.01)
+        with GurobiBackend(p, pool=pool, profile='single') as backend:
+            assert backend._env is env and backend.solve().values == {'px': 3.0}
+        with pytest.raises(KeyError):
+            pool.checkout('unknown')
+
+
+def test_bench(tmp_path):
+    import csv
+    import json
+    from bench.harness import run, to_csv, to_json
+    from bench.instances import Library
+    instances = [Library[name](seed=1) for name in ['knapsack', 'assignment', 'maxcut', 'facility']]
+    records = run(instances, {'highs': {}, 'nop': {}}, memory=False)
+    highs = {r.instance: r for r in records if r.backend == 'highs'}
+    assert all(r.gap == 0 and r.feasible for name, r in highs.items() if not name.startswith('maxcut'))
+    assert highs['maxcut-12'].error.startswith('ValueError') and highs['maxcut-12'].objective is None
+    assert [r.objective for r in records if r.backend == 'nop'] == [0.0] * 4
+    assert not next(r for r in records if r.backend == 'nop' and r.instance == 'assignment-4').feasible
+    to_json(records, tmp_path / 'bench.json')
+    to_csv(records, tmp_path / 'bench.csv')
+    assert len(json.load(open(tmp_path / 'bench.json'))) == len(list(csv.DictReader(open(tmp_path / 'bench.csv')))) == 8
+    record = run(instances[:1], ['nop'])[0]
+    assert record.peak_memory > 0 and record.convert_time >= 0
+
+
+def test_result_cache(tmp_path):
+    from backends.cache import DiskStore, MemoryStore, ResultCache
+    from backends.highs import ScipyMilpBackend
+
+    def program(cap: float = 5.5, d: Param | None = None):
+        x, y = Var('cx', lb=0, ub=10), IntVar('cy', lb=0, ub=10)
+        return Max(x + 2 * y).st(x + y <= (d if d is not None else cap), x - y >= -2)
+
+    for store in [MemoryStore(maxsize=2), DiskStore(tmp_path)]:
+        cache = ResultCache(store)
+        first = cache.solve(ScipyMilpBackend, program())
+        again = cache.solve('highs', program(), mutate_vars=True)  # a new program with the same content
+        assert (cache.stats.hits, cache.stats.misses) == (1, 1) and again.values == first.values
+        assert again.vars[0].val is not None and cache.solve(ScipyMilpBackend, program()).status == first.status
+        cache.solve(ScipyMilpBackend, program(6.5))
+        cache.solve(ScipyMilpBackend, program(), presolve=False)
+        assert (cache.stats.hits, cache.stats.misses) == (2, 3)
+
+    d = Param('cd', 5.5)
+    cache, p = ResultCache(), program(d=d)
+    cache.solve(ScipyMilpBackend, p)
+    p.bind({d: 6.5})
+    assert cache.solve(ScipyMilpBackend, p).values['cx'] == pytest.approx(2.5) and cache.stats.misses == 2
+    assert cache.solve(ScipyMilpBackend, p.lazy(lambda _: [])).status == Status.OPTIMAL and cache.stats.bypassed == 1
+
+    store = DiskStore(tmp_path / 'small', max_bytes=1)
+    ResultCache(store).solve(ScipyMilpBackend, program())
+    assert not list((tmp_path / 'small').glob('*.npz'))
+
+    cache = ResultCache()
+    first = cache.solve(ScipyMilpBackend, program())
+    first.x[:] = -1  # neither the solved result nor a hit share their arrays with the cache
+    cache.solve(ScipyMilpBackend, program()).x[:] = -1
+    assert cache.solve(ScipyMilpBackend, program()).values['cy'] == pytest.approx(3)
+    cache.solve(ScipyMilpBackend, program(), disp=True)
+    assert (cache.stats.hits, cache.stats.misses) == (3, 1)
+    assert ResultCache.key(ScipyMilpBackend, program(), {}) == ResultCache.key(ScipyMilpBackend, program(), {'disp': True})
+    with pytest.raises(TypeError):
+        ResultCache.key(ScipyMilpBackend, program(), {'time_limit': object()})
+
+
+def test_sum_where_export():
+    from backends.anneal import AnnealBackend
+    from backends.highs import ScipyMilpBackend
+    a = Var.new('wa{}', 3, lb=0, ub=2)
+    p = Max(Σ(range(3), where=lambda i: i > 0)(lambda i: a[i])).st(Σ(range(3), where=lambda i: i > 0)(lambda i: a[i]) <= 3)
+    m = p.to_matrices()
+    assert 'wa0' not in m.index and m.A.toarray().tolist() == [[1.0, 1.0]] and m.c.tolist() == [-1.0, -1.0]
+    result = ScipyMilpBackend(p).solve()
+    assert result.status == Status.OPTIMAL and sum(result.values.values()) == pytest.approx(3) and 'wa0' not in result.values
+    b = BinVar.new('wb{}', 3)
+    q = Min(-Σ(range(3), where=lambda i: i != 1)(lambda i: b[i])).st(Σ(range(3), where=lambda i: i != 1)(lambda i: b[i]) <= 1)
+    assert 'wb1' not in q.to_qubo().labels
+    result = AnnealBackend(q, num_reads=20, seed=0).solve()
+    assert result.values['wb0'] + result.values['wb2'] == 1
+
+
+def test_dimod_iter_solutions_unbatched():
+    pytest.importorskip('dimod')
+    from backends.dwave import ExactCQMBackend
+    x = BinVar.new('ux{}', 3)
+    results = list(ExactCQMBackend(Min(Σ(range(3))(lambda i: x[i])).st(x[0] + x[1] >= 1)).iter_solutions(num_reads=10))
+    assert len(results) == 1 and len(results[0].samples) == 8
+
+
+def test_gurobi_env_pool_failures():
+    gurobipy = pytest.importorskip('gurobipy')
+    from backends.gurobi import GurobiBackend, EnvPool
+    x = Var('fx', lb=0, ub=10)
+    pool = EnvPool({'default': {'OutputFlag': 0}})
+    with pytest.raises(gurobipy.GurobiError):  # a general nonlinear constraint is rejected during conversion
+        GurobiBackend(Min(x).st(x ** 3 >= 1), pool=pool)
+    backend = GurobiBackend(Min(x).st(x >= 1), pool=pool)  # the env was returned, the size 1 pool is not exhausted
+    assert backend.solve().values == {'fx': 1.0}
+    env = backend._env
+    pool.close()
+    backend.dispose()  # returned to a closed pool: disposed instead of queued
+    assert pool._idle['default'].empty() and id(env) not in pool._profile_of
+    with pytest.raises(RuntimeError):
+        pool.checkout()
+
+
+def _no_cuts(values) -> list:
+    return []
+
+
+def test_lazy_pickle_and_new_vars():
+    import pickle
+    from backends.highs import ScipyMilpBackend
+    from dsl.program import Constraint
+    x, y = Var('lx', lb=0, ub=10), Var('ly', lb=0, ub=10)
+    p = Min(x).st(x >= 0)
+    assert len(pickle.loads(pickle.dumps(p.lazy(_no_cuts))).lazy_families) == 1
+    with pytest.raises((pickle.PicklingError, AttributeError)):  # dropping it would silently relax the program
+        pickle.dumps(p.lazy(lambda values: []))
+    with pytest.raises(ValueError):
+        p.lazy(_no_cuts).dumps()
+
+    p = p.lazy(lambda values: [Constraint('cut', x + y >= 2)])
+    backends = [ScipyMilpBackend]
+    try:
+        import gurobipy
+        from backends.gurobi import GurobiBackend
+        gurobipy.setParam('OutputFlag', 0)
+        backends.append(GurobiBackend)  # continuous, so cutting planes via _add instead of the MIP callback
+    except ImportError:
+        pass
+    for backend in backends:
+        b = backend(p)
+        result = b.solve()
+        assert result.values['lx'] == pytest.approx(0) and result.values['ly'] >= 2 - 1e-6 and any(v is y for v in b.p.vars)
+
+
+def test_lazy_ignored_cuts():
+    from backends.highs import ScipyMilpBackend
+    from dsl.program import Constraint
+
+    class Ignoring(ScipyMilpBackend):  # keeps solving the model without the cuts
+        def _add(self, constraints):
+            pass
+
+    x = Var('gx', lb=0, ub=10)
+    p = Min(x).lazy(lambda values: [Constraint('cut', x >= 1)] if values['gx'] < 1 - 1e-6 else [])
+    result = Ignoring(p).solve()
+    assert result.status == Status.LAZY_VIOLATED and not Status.has_result(result.status)
+    assert result.values['gx'] == pytest.approx(0)
+    assert ScipyMilpBackend(p).solve().status == Status.OPTIMAL
+
+
+def test_gurobi_lazy_new_vars():
+    gurobipy = pytest.importorskip('gurobipy')
+    from backends.gurobi import GurobiBackend
+    from dsl.program import Constraint
+    gurobipy.setParam('OutputFlag', 0)
+    x, y = BinVar('nx'), BinVar('ny')
+    with pytest.raises(ValueError):  # cbLazy cannot add vars to the model
+        GurobiBackend(Min(x).st(x >= 0).lazy(lambda values: [Constraint('cut', x + y >= 1)])).solve()
@@ -1,5 +1,8 @@
+import numpy as np
+
 from dsl.aggregators import Σ, Dot, σ, dot
-from dsl.core import Var, Const, LT, GT, LE, GE, Eq
+from dsl.arena import Arena
+from dsl.core import Var, Const, LT, GT, LE, GE, Eq, Param
 
 x = Var()
 y = Var()
@@ -103,3 +106,102 @@ def test_simple_dot_2():
     y = Var()
     expr = dot([x, y], [y, x])
     assert expr.expand().equals(x * y + y * x)
+
+
+def test_param():
+    p = Param('p', 2.0)
+    expr = (p * 3) + 1
+    assert expr.as_equation() == '((p*3)+1)'
+    assert expr.solve() == 7
+    p.value = 3.0
+    assert expr.solve() == 10
+    assert expr.params() == {p}
+
+
+def test_param_array():
+    d = Param('d', np.array([1.0, 2.0]))
+    expr = Σ(range(2))(lambda i: d[i] * 2)
+    assert expr.solve() == 6
+    assert d[1].name == 'd[1]'
+    assert expr.params() == {d}
+
+
+def test_param_replace():
+    p = Param('p', 2.0)
+    assert (x + p).replace(x, Const(1)).contains(p)
+
+
+def test_arena():
+    a = Arena(capacity=2)
+    u, v = a.var(Var('u')), a.var(Var('v'))
+    expr = 2 * u + 3 - v * 4
+    assert expr.evaluate(np.array([1.0, 2.0])) == -3
+    refs, coeffs, offset = expr.linear()
+    assert refs.tolist() == [0, 1] and coeffs.tolist() == [2, -4] and offset == 3
+    assert expr.to_expr().as_equation() == '(((2.0*u)+3.0)-(v*4.0))'
+    assert {v.name for v in expr.vars()} == {'u', 'v'}
+    terms = a.sum(i + 0.5 for i in range(100))  # the constant pool grows past its initial capacity
+    assert len(a.values) == 103 and terms.evaluate(np.array([0.0, 0.0])) == 5000
+
+
+def test_arena_from_expr():
+    a, d = Arena(), Param('d', np.array([1.0, 2.0]))
+    vs = [Var(f'w{i}') for i in range(2)]
+    expr = a.from_expr(Σ(range(2))(lambda i: d[i] * vs[i]) <= 1)
+    refs, coeffs, offset = expr.linear()
+    assert [a.vars[r].name for r in refs] == ['w0', 'w1'] and coeffs.tolist() == [1, 2] and offset == -1
+    assert a.lift(vs[0]).id == a.lift(vs[0]).id
+    assert a.from_expr(vs[0] * vs[1]).to_expr().equals(vs[0] * vs[1])
+
+
+def test_meta():
+    u, v = Var('mu'), Var('mv')
+    expr = 3 * u * v + u ** 2 - 1
+    assert expr.degree() == 2 and not expr.is_linear() and expr.size() == 11
+    assert (2 * u + Σ(range(2))(lambda i: [u, v][i])).is_linear()
+    assert (u ** Param('mp', 2.0)).degree() == float('inf')
+    assert expr.vars() is expr.vars() and expr.vars() == {u, v}
+    assert expr.equals(3 * u * v + u ** 2 - 1)  # cached attributes are ignored
+
+
+def test_index_set():
+    from dsl.index import IndexSet
+    edges = IndexSet([(0, 1), (0, 2), (1, 2), (0, 1)])
+    assert len(edges) == 3 and (1, 2) in edges and (2, 1) not in edges
+    assert list(edges[0]) == [(1,), (2,)] and len(edges[3]) == 0
+    assert list(IndexSet.product(range(3), range(3), where=lambda i, j: i < j)) == list(edges)
+    days = IndexSet([(1, 'mon'), (2, 'tue'), (2, 'wed')])
+    assert list(edges.join(days, on=[(1, 0)])) == [(0, 1, 'mon'), (0, 2, 'tue'), (0, 2, 'wed'), (1, 2, 'tue'), (1, 2, 'wed')]
+    assert list(edges.project(1)) == [(1,), (2,)]
+
+
+def test_sparse_sum():
+    from dsl.index import IndexSet
+    edges = IndexSet([(0, 1), (1, 2)])
+    x = Var.new('e{}_{}', edges)
+    assert sorted(x) == [(0, 1), (1, 2)] and x[1, 2].name == 'e1_2'
+    assert Σ(edges)(lambda i, j: x[i, j]).expand().equals(x[0, 1] + x[1, 2])
+    assert Σ(range(3), range(3), where=lambda i, j: (i, j) in edges)(lambda i, j: x[i, j]).expand().equals(x[0, 1] + x[1, 2])
+    assert Σ(edges[2])(lambda j: x[2, j]).expr().equals(Const(0))
+
+
+def test_deque():
+    from utils.utils import Deque
+    d = Deque([1, 2])
+    assert list(d + 3) == [1, 2, 3] and list(d + [3, 4]) == [1, 2, 3, 4] and list(0 + d) == [0, 1, 2]
+    assert list([-1, 0] + d) == [-1, 0, 1, 2] and list(d) == [1, 2]
+    d += [3]
+    assert list(d) == [1, 2, 3]
+
+
+def test_subs():
+    a, b, c = Var('sa'), Var('sb'), Var('sc')
+    e = (a + b) * c + 2 * a
+    assert e.subs({a: 1, b: 2, c: 3}).equals(Const(11))
+    f = e.subs({'sc': 1})
+    assert f.equals((a + b) + 2 * a) and f.left is e.left.left and f.right is e.right
+    assert e.subs({a: 0, c: 0}).equals(Const(0)) and e.subs({b: b * 2}).equals((a + b * 2) * c + 2 * a)
+    assert (a + b <= 3).subs({a: 1, b: 2}).value and not (a + b <= 2).subs({a: 1, b: 2}).value
+    assert expr0.setn({x: 2, y: 1, z: 3}).equals(expr1) and not expr1.equals(Const(2197)) and expr1.solve() == 2197
+    xs = Var.new('ss{}', 3)
+    assert Σ(range(3))(lambda i: xs[i]).subs({xs[0]: 1}).equals(Const(1) + xs[1] + xs[2])
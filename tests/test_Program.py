@@ -1,4 +1,10 @@
-from dsl.core import Var, ContVar, BinVar
+import itertools
+
+import numpy as np
+import pytest
+
+from dsl.aggregators import Σ
+from dsl.core import Var, ContVar, BinVar, IntVar, Param
 from dsl.program import Min, Max
 
 
@@ -26,6 +32,101 @@ def test_simple_max():
     p = Max(x + y)
     assert p.objective.equals(-(x + y))  # note: -(x+y) is used since the simpler -x+y is semantically equivalent to -(x+y) but not structurally
 
+
+def test_bind():
+    x = Var()
+    c = Param('c', 1.0)
+    d = Param('d', np.array([1.0, 2.0]))
+    p = Min(c * x).st(x >= d[0], x <= d[1])
+    assert set(p.params()) == {'c', 'd'}
+    p.bind({'c': 2.0, d: np.array([3.0, 4.0])})
+    assert c.value == 2.0 and d[1].get() == 4.0
+    with pytest.raises(KeyError):
+        p.bind({'e': 1.0})
+    with pytest.raises(ValueError):
+        p.bind({'d': np.array([1.0])})
+    e = Param('e', 0.0)
+    q = p.st(x >= e)  # copies collect their own params, the registry of p is unchanged
+    q.bind({'e': 1.0})
+    assert e.value == 1.0 and 'e' not in p.params()
+    p.params().clear()
+    p.bind({'c': 3.0})
+
+
+def test_bind_invalidates_cache():
+    # Caches on shared subtrees stay valid under subs, and are dropped when a bind changes an aggregator's terms
+    u, n, xs = Var('bu'), Param('bn', 1), Var.new('bx{}', 3)
+    s = Σ(range(3), where=lambda i: i < n.get())(lambda i: xs[i])
+    p = Min(s * u)  # n is only read by the where filter, so it is bound by object
+    assert [v.name for v in s.vars()] == ['bx0'] and p.objective.degree() == 2 and p.objective.subs({u: 2}).degree() == 1
+    p.bind({n: 3})
+    assert {v.name for v in s.vars()} == {'bx0', 'bx1', 'bx2'}
+    assert {v.name for v in p.fix({xs[2]: 0, u: 1}).objective.vars()} == {'bx0', 'bx1'}
+    other = 2 * u + Σ(range(3))(lambda i: xs[i])  # binding p leaves the caches of other expressions alone
+    other.degree(), other.vars()
+    p.bind({n: 2})
+    assert '_meta' in other.__dict__ and '_vars' in other.__dict__ and '_meta' in p.objective.right.__dict__
+
+
+def test_bind_filter_param():
+    # A param only read by a where filter is not found by name until it was bound by object
+    n, xs = Param('fn', 1), Var.new('fx{}', 3)
+    p = Min(Σ(range(3), where=lambda i: i < n.get())(lambda i: xs[i]))
+    with pytest.raises(KeyError):
+        p.bind({'fn': 2})
+    p.bind({n: 2})
+    assert {v.name for v in p.objective.vars()} == {'fx0', 'fx1'}
+    p.bind({'fn': 3})
+    assert n.value == 3 and {v.name for v in p.objective.vars()} == {'fx0', 'fx1', 'fx2'}
+
+
+def test_to_matrices():
+    x, y, z = Var('x', lb=0, ub=4), IntVar('y', lb=0, ub=3), BinVar('z')
+    m = Min(2 * x + 3 * y * y - x * z + 5).st(x + 2 * y <= 4, (x - z) * 2 >= y - 1, x == 3 * z).to_matrices()
+    assert m.index == {'x': 0, 'y': 1, 'z': 2} and m.vars == [x, y, z]
+    assert m.c.tolist() == [2, 0, 0] and m.c0 == 5
+    assert m.Q.toarray().tolist() == [[0, 0, -1], [0, 3, 0], [0, 0, 0]]
+    assert m.A.toarray().tolist() == [[1, 2, 0], [2, -1, -2], [1, 0, -3]]
+    assert m.sense.tolist() == ['<', '>', '='] and m.rhs.tolist() == [4, -1, 0]
+    assert m.types.tolist() == ['C', 'I', 'B'] and m.ub.tolist() == [4, 3, 1]
+
+
+def test_to_matrices_sum():
+    v = Var.new('v{}_{}', 3, 4)
+    m = Min(Σ(range(3), range(4))(lambda i, j: (i + j) * v[i][j])).st(*[Σ(range(4))(lambda j: v[i][j]) == 1 for i in range(3)]).to_matrices()
+    assert m.shape == (3, 12) and m.A.nnz == 12 and m.is_linear()
+    assert m.c[m.index['v2_3']] == 5
+    w = Param('w', 2.0)
+    m = Min(Σ(range(4))(lambda j: w * v[0][j] + v[1][j])).to_matrices()
+    assert m.c[[m.index['v0_1'], m.index['v1_1']]].tolist() == [2, 1]
+
+
+def test_to_matrices_nonlinear():
+    x = Var()
+    with pytest.raises(ValueError):
+        Min(x * x * x).to_matrices()
+    with pytest.raises(ValueError):
+        Min(x).st(x * x <= 1).to_matrices()
+
+
+def test_to_qubo():
+    y = BinVar.new('qy{}', 4)
+    w, v = [3, 4, 2, 5], [4, 5, 3, 6]
+    q = Max(Σ(range(4))(lambda i: v[i] * y[i])).st(Σ(range(4))(lambda i: w[i] * y[i]) <= 7, y[2] + y[3] == 1).to_qubo()
+    assert q.labels == ['qy0', 'qy1', 'qy2', 'qy3', 'slack_0_0', 'slack_0_1', 'slack_0_2']
+    samples = np.array(list(itertools.product([0, 1], repeat=len(q.labels))), dtype=float)
+    best = samples[q.energy(samples).argmin()]
+    assert q.energy(best) == -8
+    assert q.invert(best) == {'qy0': 0, 'qy1': 1, 'qy2': 1, 'qy3': 0}
+    with pytest.raises(ValueError):  # the slack would silently be floored
+        Min(y[0]).st(y[0] + 2.5 * y[1] <= 3).to_qubo()
+    Min(y[0]).st(y[0] + 2.5 * y[1] <= 4, 0.5 * y[2] == 0.5).to_qubo()  # redundant rows and equalities need no slack
+
+
+def test_to_qubo_binary_only():
+    with pytest.raises(ValueError):
+        Min(Var() + BinVar()).to_qubo()
+
 #
 # def test_simple_gurobi_1():
 #     x = ContVar()
@@ -37,3 +138,112 @@ def test_simple_max():
 #     assert result.results[x.name] == 1 and result.results[y.name] == 0
 #     assert result.results[x] == 1 and result.results[y] == 0
 #     assert x.val == 1 and y.val == 0
+
+
+def test_wire():
+    x, d = BinVar.new('wx{}', 3), Param('wd', np.array([1.0, 2.0, 3.0]))
+    p = Max(Σ(range(3))(lambda i: d[i] * x[i])).st(([range(1)], lambda _: ('cap', Σ(range(3))(lambda i: x[i]) <= 2)))
+    q = Min.loads(p.dumps())
+    assert type(q) is Max and q.max and q.constraints[0].name == 'cap'
+    assert np.array_equal(q.to_matrices().c, p.to_matrices().c) and np.array_equal(q.to_matrices().A.toarray(), p.to_matrices().A.toarray())
+    assert {v.name for v in q.vars} == {'wx0', 'wx1', 'wx2'} and not {id(v) for v in q.vars} & {id(v) for v in x.values()}
+    assert {id(v) for v in Min.loads(p.dumps(), vars={v.name: v for v in x.values()}).vars} == {id(v) for v in x.values()}
+    with pytest.raises(ValueError):
+        Min.loads(b'HMNW\x09\x01')
+
+
+def test_pickle():
+    import pickle
+    x = BinVar.new('px{}', 2)
+    p = Min(Σ(range(2))(lambda i: x[i])).st(x[0] + x[1] >= 1)
+    v, e, q = pickle.loads(pickle.dumps([x[0], x[0] * 2, p]))
+    assert any(w is v for w in e.vars()) and any(w is v for w in q.vars)
+    assert q.constraints[0].expr.as_equation() == '((px0+px1)>=1.0)'
+
+
+def test_kind():
+    from dsl.program import Kind
+    x, y, b = Var('kx'), IntVar('ky', lb=0, ub=3), BinVar.new('kb{}', 2)
+    assert Min(x + 1).st(x >= 0).kind == Kind.LP
+    assert Min(x + y).st(x + y >= 1).kind == Kind.MILP
+    assert Min(x * x).st(x >= 1).kind == Kind.QP
+    assert Min(x).st(x * x <= 1).kind == Kind.QCQP
+    assert Min(x ** 3).kind == Kind.NLP
+    assert Min(b[0] * b[1]).st(b[0] + b[1] >= 1).is_bqm() and not Min(x * y).is_bqm()
+
+
+def test_rcon_sparse():
+    from dsl.index import IndexSet
+    shifts = IndexSet([('ann', 0), ('ann', 1), ('bob', 1)])
+    x = BinVar.new('sh_{}_{}', shifts)
+    p = Min(Σ(shifts)(lambda w, s: x[w, s])).rcon(range(2))(lambda s: (f'cover{s}', Σ(shifts.project(1, 0)[s])(lambda w: x[w, s]) >= 1))
+    assert [c.name for c in p.constraints] == ['cover0', 'cover1'] and len(p.vars) == 3
+    assert p.constraints[1].expr.expand().equals(x['ann', 1] + x['bob', 1] >= 1)
+    p = p.rcon(shifts, where=lambda w, s: w == 'ann')(lambda w, s: (f'fix_{w}_{s}', x[w, s] <= 1))
+    assert [c.name for c in p.constraints[2:]] == ['fix_ann_0', 'fix_ann_1']
+
+
+def _row(x: dict, n: int, i: int) -> tuple:
+    return f'row{i}', Σ(range(n))(lambda j: (i + j) * x[i][j]) <= n
+
+
+def _unnamed(i: int) -> tuple:
+    return f'u{i}', Var() >= i
+
+
+def test_st_parallel():
+    from functools import partial
+    x = BinVar.new('sp_{}_{}', 5, 4)
+    p = Min(Σ(range(5), range(4))(lambda i, j: x[i][j]))
+    serial = p.st(x[0][0] >= 0, ([range(5)], partial(_row, x, 4)), x[1][1] <= 1)
+    for processes in [False, True]:
+        q = p.st_parallel(x[0][0] >= 0, ([range(5)], partial(_row, x, 4)), x[1][1] <= 1, processes=processes, workers=2,
+                          chunk_size=2, vars={v.name: v for row in x.values() for v in row.values()})
+        assert [c.name for c in q.constraints] == [c.name for c in serial.constraints] == ['0'] + [f'row{i}' for i in range(5)] + ['2']
+        assert all(c.expr.expand().equals(d.expr.expand()) for c, d in zip(q.constraints, serial.constraints))
+        assert {id(v) for v in q.vars} == {id(v) for v in serial.vars}
+        # like st, st_parallel replaces the constraints of the program
+        assert [c.name for c in p.st(x[0][0] >= 0).st_parallel(x[1][1] <= 1, processes=processes).constraints] == ['0']
+    with pytest.raises(ValueError):  # auto-generated names of different processes would collide
+        p.st_parallel(([range(2)], _unnamed), processes=True, workers=2)
+    from dsl.program import _build_wire
+    before = int(Var().name[1:])
+    _build_wire(partial(_row, x, 4), [(0,), (1,)])  # the check does not use up auto-generated names
+    assert int(Var().name[1:]) == before + 1
+    with pytest.raises(ValueError):
+        _build_wire(_unnamed, [(0,)])
+
+
+def test_var_names_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(8) as pool:
+        names = [v.name for vs in pool.map(lambda _: [Var() for _ in range(1000)], range(8)) for v in vs]
+    assert len(set(names)) == len(names)
+
+
+def test_fix():
+    x = BinVar.new('fx{}', 3)
+    p = Max(Σ(range(3))(lambda i: (i + 1) * x[i])).st(x[0] + x[1] <= 1, x[1] + x[2] <= 1)
+    q = p.fix({x[1]: 0})
+    assert [c.name for c in q.constraints] == ['0', '1'] and {v.name for v in q.vars} == {'fx0', 'fx2'} and q.max
+    assert q.fix({x[0]: 1, x[2]: 1}).constraints == [] and q.fix({x[0]: 1, x[2]: 1}).objective.solve() == -4
+    with pytest.raises(ValueError):
+        p.fix({x[0]: 1, x[1]: 1})
+
+
+def test_wire_unbounded():
+    from backends.highs import ScipyMilpBackend
+    x = Var.new('ub{}', 2)  # no bounds
+    p = Min(x[0] + x[1]).st(x[0] + x[1] >= 1, x[0] - x[1] == 0)
+    q = Min.loads(p.dumps())
+    assert all(v.lb is None and v.ub is None for v in q.vars)
+    assert np.array_equal(q.to_matrices().lb, p.to_matrices().lb) and np.array_equal(q.to_matrices().ub, p.to_matrices().ub)
+    assert ScipyMilpBackend(q).solve().values == pytest.approx({'ub0': 0.5, 'ub1': 0.5})
+
+
+def test_wire_class_check():
+    data = Min(Var('wc')).dumps()
+    assert b'dsl.program:Min' in data
+    for name in [b'dsl.core:BinVar', b'builtins:divmod']:  # a class which is no Program and an arbitrary callable
+        with pytest.raises(ValueError):
+            Min.loads(data.replace(b'dsl.program:Min', name))